@@ -1,9 +1,67 @@
-from crypy.aes import *
-from crypy.arith import *
-from crypy.dlog import *
-from crypy.gcm import *
-from crypy.hash import *
-from crypy.lattice import *
-from crypy.polynomial import *
-from crypy.rsa import *
-from crypy.util import *
+"""Various crypto attacks/utilities for CTFs.
+
+Submodules are imported lazily: `import crypy` only sets up the table below, and a
+name like `crypy.xor` imports its submodule (here crypy.util) on first access. This
+keeps startup fast for scripts that only need a few helpers. `from crypy import *`
+still exports everything, at the cost of importing every submodule.
+"""
+import importlib
+
+# The __all__ of each submodule, which tests/test_init.py keeps in sync. On a conflict,
+# the later submodule wins, as with the star imports this replaces.
+_exports = {
+    'aes': [
+        'PaddingOracleResult', 'aes_key_search', 'cbcdec', 'cbcdec_stream', 'cbcenc',
+        'cbcenc_stream', 'ecb_byte_at_a_time', 'ecbdec', 'ecbdec_many', 'ecbdec_stream',
+        'ecbenc', 'ecbenc_many', 'ecbenc_stream', 'padding_oracle',
+        'padding_oracle_async',
+    ],
+    'arith': ['igcd', 'igcdex', 'ilcm', 'iroot'],
+    'dlog': ['dlog', 'dlog_cado', 'dlog_pari'],
+    'gcm': [
+        'GHash', 'b2gcm', 'gcm2b', 'gcm2i', 'gcm2i_many', 'gcm_nonce_reuse', 'gcm_pack',
+        'gcm_unpack', 'gf128_mul', 'gfield', 'ghash', 'gobj', 'i2gcm', 'i2gcm_many',
+    ],
+    'hash': [
+        'CollisionResult', 'HashAlgorithm', 'MD4', 'MD5', 'PowResult', 'PrefixCache',
+        'SHA1', 'SHA224', 'SHA256', 'SHA384', 'SHA512', 'collide', 'extend_truncated',
+        'md2', 'md4', 'md5', 'pow_search', 'sha1', 'sha224', 'sha256', 'sha384',
+        'sha512',
+    ],
+    'lattice': [
+        'BKZ', 'CVPSolver', 'Flatter', 'LLL', 'SP', 'SPC', 'SymPoly',
+        'SymPolyConstraint', 'bkz', 'cvp_babai', 'cvp_kannan', 'flatter',
+        'get_cvp_weights', 'lll', 'ortho_lattice', 'solve_lineq', 'solve_lineq_poly',
+        'spolys_to_matrix',
+    ],
+    'polynomial': ['pgcd', 'pgcdex', 'resultant'],
+    'rsa': ['factor_cado', 'fermat', 'hastad', 'rsadec'],
+    'util': [
+        'Words', 'b2i', 'b64d', 'b64e', 'b64ud', 'b64ue', 'brev', 'brev_bytes',
+        'brev_many', 'ci', 'ci8', 'ci16', 'ci32', 'ci64', 'cu', 'cu8', 'cu16', 'cu32',
+        'cu64', 'i2b', 'iter_unpacks', 'pad', 'rol', 'rol8', 'rol16', 'rol32', 'rol64',
+        'ror', 'ror8', 'ror16', 'ror32', 'ror64', 'u8', 'u16', 'u32', 'u64', 'u8s',
+        'u16s', 'u32s', 'u64s', 'unpack', 'unpacks', 'unpad', 'xor', 'xor_into', 'xork',
+        'zpad',
+    ],
+    'xorcrack': [
+        'CribDragger', 'CribResult', 'english_freqs', 'xork_keylens', 'xork_solve',
+    ],
+}
+
+_origins = {name: module for module, names in _exports.items() for name in names}
+
+__all__ = list(_origins)
+
+
+def __getattr__(name):
+    if name in _exports:
+        return importlib.import_module(f'crypy.{name}')
+    if name not in _origins:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(f'crypy.{_origins[name]}'), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted({*globals(), *__all__, *_exports})
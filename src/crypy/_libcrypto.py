@@ -0,0 +1,55 @@
+"""Optional access to the system libcrypto through ctypes.
+
+The library is located with `ctypes.util.find_library`, or taken from the path in the
+`CRYPY_LIBCRYPTO` environment variable. Setting it to an empty string disables every
+native backend. Autodetection is skipped on macOS, where loading the unversioned
+system libcrypto aborts the process.
+"""
+import ctypes
+import ctypes.util
+import os
+import sys
+
+# Large enough for OpenSSL's AES_KEY (60 round key words and the number of rounds)
+AES_KEY_SIZE = 256
+
+_libcrypto = None
+_loaded = False
+
+
+def load_libcrypto():
+    """Return the system libcrypto as a ctypes.CDLL, or None if it is unavailable."""
+    global _libcrypto, _loaded
+    if not _loaded:
+        _loaded = True
+        path = os.environ.get('CRYPY_LIBCRYPTO')
+        if path is None and sys.platform != 'darwin':
+            path = ctypes.util.find_library('crypto')
+        if path:
+            try:
+                _libcrypto = ctypes.CDLL(path)
+            except OSError:
+                pass
+    return _libcrypto
+
+def load_aes():
+    """Load OpenSSL's low-level AES functions.
+
+    Returns (set_encrypt_key, encrypt) with their signatures declared, or None if they
+    are not available:
+        set_encrypt_key(key, bits, schedule) returns 0 on success, where `schedule` is
+        a buffer of AES_KEY_SIZE bytes.
+        encrypt(block, out, schedule) encrypts one 16-byte block into `out`.
+    """
+    lib = load_libcrypto()
+    if lib is None:
+        return None
+    try:
+        set_key, encrypt = lib.AES_set_encrypt_key, lib.AES_encrypt
+    except AttributeError:
+        return None
+    set_key.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.c_void_p]
+    set_key.restype = ctypes.c_int
+    encrypt.argtypes = [ctypes.c_char_p, ctypes.c_void_p, ctypes.c_void_p]
+    encrypt.restype = None
+    return (set_key, encrypt)
@@ -1,24 +1,567 @@
 from Crypto.Cipher import AES
+from functools import lru_cache
+from typing import NamedTuple
+import os
+import time
+from crypy.util import xor
 
 __all__ = [
+    'PaddingOracleResult',
+    'aes_key_search',
     'cbcdec',
+    'cbcdec_stream',
     'cbcenc',
+    'cbcenc_stream',
+    'ecb_byte_at_a_time',
     'ecbdec',
+    'ecbdec_many',
+    'ecbdec_stream',
     'ecbenc',
+    'ecbenc_many',
+    'ecbenc_stream',
+    'padding_oracle',
+    'padding_oracle_async',
 ]
 
-def ecbenc(pt, key):
-    """Encrypt a 16-byte aligned plaintext with AES-ECB."""
-    return AES.new(key, AES.MODE_ECB).encrypt(pt)
+# Sizes from which the native CBC mode beats building CBC on a cached ECB object. Setting
+# up a CBC object costs about as much as chaining two blocks through ECB in Python, or
+# as XORing 1 KiB of ECB output.
+_CBCENC_NATIVE_SIZE = 32
+_CBCDEC_NATIVE_SIZE = 1024
 
-def ecbdec(ct, key):
-    """Decrypt a 16-byte aligned ciphertext with AES-ECB."""
-    return AES.new(key, AES.MODE_ECB).decrypt(ct)
+@lru_cache(maxsize=256)
+def _ecb(key):
+    """Return an AES-ECB cipher object for `key`, keeping the expanded key of recently
+    used keys. ECB objects carry no state between calls, so they can be shared.
+    """
+    return AES.new(key, AES.MODE_ECB)
 
-def cbcenc(pt, key, iv):
-    """Encrypt a 16-byte aligned plaintext with AES-CBC."""
-    return AES.new(key, AES.MODE_CBC, iv).encrypt(pt)
+def _view(data):
+    """Make buffers like mmaps acceptable to pycryptodome, which wants bytes, bytearrays
+    or memoryviews.
+    """
+    if data is None or isinstance(data, (bytes, bytearray, memoryview)):
+        return data
+    return memoryview(data)
 
-def cbcdec(ct, key, iv):
-    """Decrypt a 16-byte aligned ciphertext with AES-CBC."""
-    return AES.new(key, AES.MODE_CBC, iv).decrypt(ct)
+def ecbenc(pt, key, output=None):
+    """Encrypt a 16-byte aligned plaintext with AES-ECB.
+
+    If a writable buffer `output` is given, the ciphertext is written to it instead of
+    being returned, as in pycryptodome.
+    """
+    return _ecb(bytes(key)).encrypt(_view(pt), output=_view(output))
+
+def ecbdec(ct, key, output=None):
+    """Decrypt a 16-byte aligned ciphertext with AES-ECB, optionally into `output`."""
+    return _ecb(bytes(key)).decrypt(_view(ct), output=_view(output))
+
+def ecbenc_many(pts, key):
+    """Encrypt many 16-byte aligned plaintexts with AES-ECB in a single call."""
+    return _split(ecbenc(b''.join(pts), key), pts)
+
+def ecbdec_many(cts, key):
+    """Decrypt many 16-byte aligned ciphertexts with AES-ECB in a single call."""
+    return _split(ecbdec(b''.join(cts), key), cts)
+
+def _split(data, like):
+    """Split `data` into pieces with the same lengths as the strings in `like`."""
+    out = []
+    pos = 0
+    for s in like:
+        out.append(data[pos:pos+len(s)])
+        pos += len(s)
+    return out
+
+def _check_cbc(data, iv):
+    # Same errors as AES.new(key, AES.MODE_CBC, iv)
+    if len(iv) != 16:
+        raise ValueError('Incorrect IV length (it must be 16 bytes long)')
+    if len(data) % 16 != 0:
+        raise ValueError('Data must be padded to 16 byte boundary in CBC mode')
+
+def cbcenc(pt, key, iv, output=None):
+    """Encrypt a 16-byte aligned plaintext with AES-CBC, optionally into `output`."""
+    _check_cbc(pt, iv)
+    if len(pt) >= _CBCENC_NATIVE_SIZE or output is not None:
+        return AES.new(key, AES.MODE_CBC, iv).encrypt(_view(pt), output=_view(output))
+    ecb = _ecb(bytes(key))
+    out = []
+    for i in range(0, len(pt), 16):
+        iv = ecb.encrypt(xor(pt[i:i+16], iv))
+        out.append(iv)
+    return b''.join(out)
+
+def cbcdec(ct, key, iv, output=None):
+    """Decrypt a 16-byte aligned ciphertext with AES-CBC, optionally into `output`."""
+    _check_cbc(ct, iv)
+    if len(ct) >= _CBCDEC_NATIVE_SIZE or output is not None:
+        return AES.new(key, AES.MODE_CBC, iv).decrypt(_view(ct), output=_view(output))
+    return xor(ecbdec(ct, key), bytes(iv) + bytes(ct[:-16]))
+
+def _stream(process, src, dst, chunk_size):
+    """Feed `src` through `process(data, output)` in chunks, writing to `dst`.
+
+    `src` is a path, a binary file or a buffer, and `dst` is a path, a binary file or
+    a writable buffer. Buffers are processed in place without copies, and files go
+    through two reusable buffers. Returns the number of bytes processed.
+    """
+    if isinstance(src, (str, os.PathLike)):
+        with open(src, 'rb') as f:
+            return _stream(process, f, dst, chunk_size)
+    if isinstance(dst, (str, os.PathLike)):
+        with open(dst, 'wb') as f:
+            return _stream(process, src, f, chunk_size)
+    chunk_size = max(16, chunk_size - chunk_size % 16)
+    try:
+        out = memoryview(dst).cast('B')
+        out_buf = None
+    except TypeError:
+        out = None
+        out_buf = memoryview(bytearray(chunk_size))
+    pos = 0
+
+    def emit(data):
+        nonlocal pos
+        n = len(data)
+        if out is not None:
+            process(data, out[pos:pos+n])
+        else:
+            process(data, out_buf[:n])
+            dst.write(out_buf[:n])
+        pos += n
+
+    try:
+        view = memoryview(src).cast('B')
+    except TypeError:
+        view = None
+    if view is not None:
+        if len(view) % 16 != 0:
+            raise ValueError('Data must be aligned to block boundary')
+        for i in range(0, len(view), chunk_size):
+            emit(view[i:i+chunk_size])
+        return pos
+    buf = memoryview(bytearray(chunk_size))
+    filled = 0
+    # Reads may be short, so only whole blocks are processed and the rest is kept
+    while n := src.readinto(buf[filled:]):
+        filled += n
+        end = filled - filled % 16
+        if end:
+            emit(buf[:end])
+        buf[:filled - end] = buf[end:filled]
+        filled -= end
+    if filled:
+        raise ValueError('Data must be aligned to block boundary')
+    return pos
+
+def ecbenc_stream(src, dst, key, chunk_size=1 << 20):
+    """Encrypt `src` to `dst` with AES-ECB in constant memory.
+
+    Parameters:
+        src: The plaintext, as a path, a binary file, or a buffer such as an mmap.
+        dst: Where to write the ciphertext: a path, a binary file, or a writable buffer
+        at least as large as the plaintext.
+        key: The key.
+        chunk_size: The number of bytes encrypted per call.
+
+    Returns the number of bytes encrypted.
+    """
+    ecb = _ecb(bytes(key))
+    return _stream(lambda data, out: ecb.encrypt(data, output=out), src, dst, chunk_size)
+
+def ecbdec_stream(src, dst, key, chunk_size=1 << 20):
+    """Decrypt `src` to `dst` with AES-ECB in constant memory, as in ecbenc_stream()."""
+    ecb = _ecb(bytes(key))
+    return _stream(lambda data, out: ecb.decrypt(data, output=out), src, dst, chunk_size)
+
+def cbcenc_stream(src, dst, key, iv, chunk_size=1 << 20):
+    """Encrypt `src` to `dst` with AES-CBC in constant memory, as in ecbenc_stream().
+
+    A single CBC object is used for all chunks, so the chaining carries across them.
+    """
+    cbc = AES.new(key, AES.MODE_CBC, iv)
+    return _stream(lambda data, out: cbc.encrypt(data, output=out), src, dst, chunk_size)
+
+def cbcdec_stream(src, dst, key, iv, chunk_size=1 << 20):
+    """Decrypt `src` to `dst` with AES-CBC in constant memory, as in ecbenc_stream()."""
+    cbc = AES.new(key, AES.MODE_CBC, iv)
+    return _stream(lambda data, out: cbc.decrypt(data, output=out), src, dst, chunk_size)
+
+def _ecb_block_size(oracle):
+    """Return (block size, length of prefix || secret) of a padding ECB oracle."""
+    base = len(oracle(b''))
+    for i in range(1, 257):
+        n = len(oracle(b'A' * i))
+        if n > base:
+            return n - base, base - i
+    raise ValueError('the ciphertext length never changed')
+
+def _ecb_prefix_len(oracle, bs):
+    """Return the length of the fixed prefix that the ECB oracle puts before our input."""
+    def repeats(filler, k):
+        ct = oracle(b'\x00' * k + filler * (2 * bs))
+        blocks = [ct[i:i+bs] for i in range(0, len(ct), bs)]
+        return {j: blocks[j] for j in range(len(blocks) - 1) if blocks[j] == blocks[j + 1]}
+
+    for k in range(bs):
+        # Our blocks change with the filler, unlike repeated blocks inside the prefix
+        a, b = repeats(b'A', k), repeats(b'B', k)
+        ours = [j for j in a if j in b and a[j] != b[j]]
+        if ours:
+            return ours[0] * bs - k
+    raise ValueError('the oracle does not look like ECB')
+
+def ecb_byte_at_a_time(oracle, prefix_len=None):
+    """Recover the secret appended by an ECB encryption oracle, one query per byte.
+
+    Parameters:
+        oracle: A callable taking our input and returning ECB(prefix || input || secret),
+        padded with PKCS #7.
+        prefix_len: The length of the fixed prefix, detected by default.
+
+    Each query holds all 256 candidate blocks (the last block_size - 1 known bytes
+    followed by a guess), then filler which makes the next unknown byte of the secret
+    the last byte of a block. The guess whose block encrypts like that block is the
+    secret byte. Detecting the block size and the prefix length takes up to about
+    3 * block_size more queries.
+
+    References:
+        - https://cryptopals.com/sets/2/challenges/12
+        - https://cryptopals.com/sets/2/challenges/14
+    """
+    bs, total = _ecb_block_size(oracle)
+    if prefix_len is None:
+        prefix_len = _ecb_prefix_len(oracle, bs)
+    align = b'A' * (-prefix_len % bs)
+    start = (prefix_len + len(align)) // bs
+    secret = b''
+    for i in range(total - prefix_len):
+        window = (b'A' * (bs - 1) + secret)[-(bs - 1):]
+        filler = b'A' * (bs - 1 - i % bs)
+        candidates = b''.join(window + bytes([g]) for g in range(256))
+        ct = oracle(align + candidates + filler)
+        target = start + 256 + (len(filler) + i) // bs
+        table = {ct[(start+g)*bs:(start+g+1)*bs]: g for g in range(256)}
+        g = table.get(ct[target*bs:(target+1)*bs])
+        if g is None:
+            raise ValueError(f'no candidate matched secret byte {i}')
+        secret += bytes([g])
+    return secret
+
+
+class PaddingOracleResult(NamedTuple):
+    """Result of padding_oracle(): the recovered plaintext and query statistics."""
+    plaintext: bytes
+    queries: int
+    seconds: float
+
+    @property
+    def qps(self):
+        """The number of oracle queries answered per second."""
+        return self.queries / self.seconds if self.seconds else float('inf')
+
+
+def _padding_oracle_block(prev, block, batch_size):
+    """Recover one CBC plaintext block given its predecessor.
+
+    A generator which yields lists of queries (forged IV || block) and is sent back the
+    list of oracle answers. Returns the plaintext block.
+    """
+    bs = len(block)
+    inter = bytearray(bs)
+    for p in range(1, bs + 1):
+        k = bs - p
+        forged = bytearray(bs)
+        for j in range(k + 1, bs):
+            forged[j] = inter[j] ^ p
+        found = None
+        for start in range(0, 256, batch_size):
+            guesses = range(start, min(256, start + batch_size))
+            queries = []
+            for g in guesses:
+                forged[k] = g
+                queries.append(bytes(forged) + block)
+            hits = [g for g, valid in zip(guesses, (yield queries)) if valid]
+            if p == 1 and hits:
+                # Rule out hits ending in e.g. \x02\x02 by also changing the byte before
+                queries = []
+                for g in hits:
+                    forged[k], forged[k - 1] = g, 1
+                    queries.append(bytes(forged) + block)
+                forged[k - 1] = 0
+                hits = [g for g, valid in zip(hits, (yield queries)) if valid]
+            if hits:
+                found = hits[0]
+                break
+        if found is None:
+            raise ValueError('the oracle rejected every candidate byte')
+        inter[k] = found ^ p
+    return bytes(i ^ c for i, c in zip(inter, prev))
+
+def _padding_oracle_jobs(ct, iv, block_size, batch_size):
+    if len(ct) % block_size != 0:
+        raise ValueError('ciphertext length must be a multiple of the block size')
+    blocks = [ct[i:i+block_size] for i in range(0, len(ct), block_size)]
+    if iv is None:
+        if not blocks:
+            raise ValueError('ciphertext must start with an IV')
+        iv, blocks = blocks[0], blocks[1:]
+    prevs = [iv] + blocks[:-1]
+    return [_padding_oracle_block(p, b, batch_size) for p, b in zip(prevs, blocks)]
+
+def _padding_oracle_step(jobs, pending, answers, results):
+    """Feed a round of oracle answers back to the block jobs which asked for them."""
+    pos = 0
+    for i in list(pending):
+        n = len(pending[i])
+        try:
+            pending[i] = jobs[i].send(answers[pos:pos+n])
+        except StopIteration as e:
+            results[i] = e.value
+            del pending[i]
+        pos += n
+
+def padding_oracle(ct, oracle, iv=None, block_size=16, batch_size=256, workers=1,
+                   batched=False):
+    """Decrypt a CBC ciphertext using a padding oracle.
+
+    Parameters:
+        ct: The ciphertext. If `iv` is not given, its first block is the IV.
+        oracle: A callable taking IV || ciphertext and returning whether it decrypts
+        to validly padded plaintext. It may be a coroutine function (see
+        padding_oracle_async()).
+        iv: The IV of the ciphertext.
+        block_size: The block size of the cipher.
+        batch_size: The number of candidate bytes to query per round. With 256, all
+        candidates are sent at once; smaller batches stop early but need more rounds.
+        workers: The number of threads sending queries concurrently.
+        batched: Whether `oracle` takes a list of queries and returns a list of
+        answers, e.g. to send many queries in a single request.
+
+    The blocks are independent given their predecessors, so all of them are attacked
+    at the same time: every round sends one batch of candidates for every unfinished
+    block. Returns a PaddingOracleResult, whose plaintext includes the padding.
+
+    References:
+        - https://en.wikipedia.org/wiki/Padding_oracle_attack
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import inspect
+
+    if inspect.iscoroutinefunction(oracle):
+        import asyncio
+
+        return asyncio.run(padding_oracle_async(
+            ct, oracle, iv, block_size, batch_size, workers, batched
+        ))
+    jobs = _padding_oracle_jobs(ct, iv, block_size, batch_size)
+    pending = {i: next(job) for i, job in enumerate(jobs)}
+    results = [None] * len(jobs)
+    queries = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        while pending:
+            batch = [q for qs in pending.values() for q in qs]
+            if batched:
+                answers = list(oracle(batch))
+            elif workers > 1:
+                answers = list(executor.map(oracle, batch))
+            else:
+                answers = [oracle(q) for q in batch]
+            queries += len(batch)
+            _padding_oracle_step(jobs, pending, answers, results)
+    return PaddingOracleResult(b''.join(results), queries, time.perf_counter() - start)
+
+async def padding_oracle_async(ct, oracle, iv=None, block_size=16, batch_size=256,
+                               workers=64, batched=False):
+    """Decrypt a CBC ciphertext using an asynchronous padding oracle.
+
+    This is the coroutine version of padding_oracle(), where `oracle` is a coroutine
+    function and up to `workers` queries are awaited concurrently.
+    """
+    import asyncio
+
+    jobs = _padding_oracle_jobs(ct, iv, block_size, batch_size)
+    pending = {i: next(job) for i, job in enumerate(jobs)}
+    results = [None] * len(jobs)
+    semaphore = asyncio.Semaphore(workers)
+    queries = 0
+
+    async def query(q):
+        async with semaphore:
+            return await oracle(q)
+
+    start = time.perf_counter()
+    while pending:
+        batch = [q for qs in pending.values() for q in qs]
+        if batched:
+            answers = list(await oracle(batch))
+        else:
+            answers = await asyncio.gather(*map(query, batch))
+        queries += len(batch)
+        _padding_oracle_step(jobs, pending, answers, results)
+    return PaddingOracleResult(b''.join(results), queries, time.perf_counter() - start)
+
+
+def _key_positions(template, unknown):
+    """Return the bit positions (from the least significant bit of the key read as a
+    big-endian integer) that are unknown in `template`.
+    """
+    n = len(template)
+    if isinstance(unknown, (bytes, bytearray, memoryview)):
+        if len(unknown) != n:
+            raise ValueError('the mask must have the same length as the key')
+        mask = int.from_bytes(unknown, 'big')
+    else:
+        mask = 0
+        for i in unknown:
+            mask |= 0xff << (8 * (n - 1 - i))
+    return [i for i in range(8 * n) if mask >> i & 1]
+
+def _scatter(v, positions):
+    """Deposit the bits of `v` into the given bit positions."""
+    out = 0
+    for i, p in enumerate(positions):
+        out |= (v >> i & 1) << p
+    return out
+
+def _key_search_worker(task):
+    """Try the candidates in [lo, hi). Returns (key, lo, hi), where key is None if
+    none of them encrypts `pt` to `ct`.
+    """
+    known, positions, keylen, pt, ct, lo, hi = task
+    # The lowest bits come from a table, and the rest change once per table
+    low = min(len(positions), 16)
+    table = [0]
+    for p in positions[:low]:
+        table += [t | 1 << p for t in table]
+    import ctypes
+    from crypy._libcrypto import AES_KEY_SIZE, load_aes
+
+    native = load_aes()
+    if native is not None:
+        set_key, encrypt = native
+        schedule = ctypes.create_string_buffer(AES_KEY_SIZE)
+        out = ctypes.create_string_buffer(16)
+    bits = 8 * keylen
+    for high in range(lo >> low, ((hi - 1) >> low) + 1):
+        base = known | _scatter(high, positions[low:])
+        start = max(lo, high << low) - (high << low)
+        stop = min(hi, (high + 1) << low) - (high << low)
+        for t in table[start:stop]:
+            key = (base | t).to_bytes(keylen, 'big')
+            # One AES key expansion and block encryption in libcrypto if possible
+            if native is not None and set_key(key, bits, schedule) == 0:
+                encrypt(pt, out, schedule)
+                if out.raw == ct:
+                    return (key, lo, hi)
+            elif AES.new(key, AES.MODE_ECB).encrypt(pt) == ct:
+                return (key, lo, hi)
+    return (None, lo, hi)
+
+def _save_checkpoint(path, state):
+    import json
+
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def aes_key_search(template, unknown, pt, ct, processes=None, chunk_size=1 << 16,
+                   checkpoint=None, checkpoint_interval=10.0, progress=None):
+    """Brute force the unknown bits of an AES key from a known plaintext/ciphertext pair.
+
+    Parameters:
+        template: The key, with arbitrary values at the unknown positions.
+        unknown: The unknown positions, either as a mask of the same length as the key
+        with the unknown bits set, or as an iterable of unknown byte indices.
+        pt: A known plaintext block (only the first 16 bytes are used).
+        ct: The AES-ECB encryption of `pt`.
+        processes: The number of worker processes (os.cpu_count() by default).
+        chunk_size: The number of keys tried at once by a worker.
+        checkpoint: A file to record progress in. If it exists, the search resumes
+        from it.
+        checkpoint_interval: The minimum number of seconds between checkpoints.
+        progress: A callback taking (done, total, keyrate), called after each chunk.
+
+    The keyspace is split into chunks which are searched by a pool of workers, and the
+    search stops at the first match. Each key costs one key expansion and one block
+    encryption, done through libcrypto's low-level AES functions when they are
+    available. Returns the key, or None if no candidate matches.
+
+    The checkpoint stores the number of keys below which every chunk has been
+    searched, so a restarted search repeats at most one chunk per worker.
+    """
+    import json
+    import multiprocessing
+
+    template = bytes(template)
+    pt, ct = bytes(pt[:16]), bytes(ct[:16])
+    if len(template) not in (16, 24, 32):
+        raise ValueError('the key must be 16, 24 or 32 bytes long')
+    if len(pt) != 16 or len(ct) != 16:
+        raise ValueError('pt and ct must be at least one block long')
+    positions = _key_positions(template, unknown)
+    keylen = len(template)
+    known = int.from_bytes(template, 'big') & ~_scatter(-1, positions)
+    total = 1 << len(positions)
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    params = {
+        'template': template.hex(),
+        'positions': positions,
+        'pt': pt.hex(),
+        'ct': ct.hex(),
+        'chunk_size': chunk_size,
+    }
+    state = {**params, 'done': 0, 'key': None}
+    if checkpoint is not None and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            saved = json.load(f)
+        if {k: saved.get(k) for k in params} != params:
+            raise ValueError('the checkpoint belongs to a different search')
+        state = saved
+        if state['key'] is not None:
+            return bytes.fromhex(state['key'])
+
+    # Every key below state['done'] has been tried, so it is always on a chunk boundary
+    chunks = range(state['done'] // chunk_size, -(-total // chunk_size))
+    tasks = (
+        (known, positions, keylen, pt, ct, i * chunk_size, min(total, (i + 1) * chunk_size))
+        for i in chunks
+    )
+    found = None
+    finished = set()
+    done = resumed = state['done']
+    start = last_save = time.perf_counter()
+    if processes == 1:
+        results = map(_key_search_worker, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.get_context().Pool(processes)
+        results = pool.imap_unordered(_key_search_worker, tasks)
+    try:
+        for found, lo, hi in results:
+            if found is not None:
+                state['key'] = found.hex()
+                break
+            done += hi - lo
+            finished.add(lo)
+            while state['done'] in finished:
+                finished.remove(state['done'])
+                state['done'] = min(total, state['done'] + chunk_size)
+            now = time.perf_counter()
+            if checkpoint is not None and now - last_save >= checkpoint_interval:
+                _save_checkpoint(checkpoint, state)
+                last_save = now
+            if progress is not None:
+                progress(done, total, (done - resumed) / (now - start))
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if checkpoint is not None:
+            _save_checkpoint(checkpoint, state)
+    return found
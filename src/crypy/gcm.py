@@ -1,15 +1,26 @@
-from crypy.util import b2i, brev, i2b, zpad
+from functools import lru_cache
+from crypy.util import b2i, brev, brev_bytes, brev_many, i2b, zpad
 
 __all__ = [
+    'GHash',
     'b2gcm',
     'gcm2b',
     'gcm2i',
+    'gcm2i_many',
+    'gcm_nonce_reuse',
+    'gcm_pack',
     'gcm_unpack',
+    'gf128_mul',
     'gfield',
+    'ghash',
     'gobj',
     'i2gcm',
+    'i2gcm_many',
 ]
 
+# x^128 + x^7 + x^2 + x + 1 without the x^128 term, in the GCM bit order
+_R = 0xe1 << 120
+
 
 _gcm_obj = None
 _gcm_field = None
@@ -34,12 +45,12 @@ def gobj():
     return _gcm_obj
 
 def b2gcm(b):
-    """Convert a byte string to an element of the AES-GCM field."""
-    return l2gcm(b2l(b))
+    """Convert a 16-byte string to an element of the AES-GCM field."""
+    return i2gcm(b2i(b))
 
 def gcm2b(g):
-    """Convert an element of the AES-GCM field to a byte string."""
-    return l2b(gcm2l(g))
+    """Convert an element of the AES-GCM field to a 16-byte string."""
+    return i2b(gcm2i(g), 16)
 
 def i2gcm(n):
     """Convert a 128-bit integer to an element of the AES-GCM field."""
@@ -49,10 +60,188 @@ def gcm2i(g):
     """Convert an element of the AES-GCM field to a 128-bit integer."""
     return brev(g.to_integer(), 128)
 
-def gcm_unpack(ct):
+def i2gcm_many(ns):
+    """Convert many 128-bit integers to elements of the AES-GCM field.
+
+    The bit reversals are done at once by brev_many(), but each element is still built
+    with its own from_integer() call.
+    """
+    from_integer = gfield().from_integer
+    return [from_integer(n) for n in brev_many(ns, 128)]
+
+def gcm2i_many(gs):
+    """Convert many elements of the AES-GCM field to 128-bit integers."""
+    return brev_many([g.to_integer() for g in gs], 128)
+
+def gcm_unpack(ct, field=True):
     """Unpack a ciphertext into 16-byte blocks in the AES-GCM field.
 
+    With field=False, the blocks are returned as the 128-bit integers used by GHash
+    instead, which does not need Sage.
+
+    The bits of the whole padded buffer are reversed in one pass, but each element is
+    still built with its own from_integer() call.
+
     Note: the ciphertext is zero-padded if it's not a multiple of 16.
     """
-    ct = zpad(ct, 16)
-    return [b2gcm(ct[i:i+16]) for i in range(0, len(ct), 16)]
+    ct = zpad(bytes(ct), 16)
+    if not field:
+        return [int.from_bytes(ct[i:i+16], 'big') for i in range(0, len(ct), 16)]
+    # Each block of the reversed buffer, read as a little-endian integer, is the bit
+    # reversal of the original block
+    rev = brev_bytes(ct)
+    from_integer = gfield().from_integer
+    return [from_integer(int.from_bytes(rev[i:i+16], 'little'))
+            for i in range(0, len(rev), 16)]
+
+def gcm_pack(blocks):
+    """Pack 16-byte blocks, given as field elements or integers, into a byte string.
+
+    This is the inverse of gcm_unpack(), except that the zero padding is kept.
+    """
+    if all(isinstance(b, int) for b in blocks):
+        return b''.join(b.to_bytes(16, 'big') for b in blocks)
+    return brev_bytes(b''.join(b.to_integer().to_bytes(16, 'little') for b in blocks))
+
+
+# Sage-free arithmetic. Elements of GF(2^128) are 128-bit integers read from 16-byte
+# blocks in big-endian order, so that the most significant bit is the coefficient of 1
+# and the least significant bit is the coefficient of x^127, as in the GCM spec.
+
+def gf128_mul(x, y):
+    """Multiply two elements of the AES-GCM field, given as 128-bit integers.
+
+    This is the bitwise algorithm from NIST SP 800-38D. To multiply many elements by
+    the same H, GHash(H).mul() is much faster.
+    """
+    z = 0
+    for i in range(127, -1, -1):
+        if x >> i & 1:
+            z ^= y
+        y = (y >> 1) ^ _R if y & 1 else y >> 1
+    return z
+
+
+class GHash:
+    """GHASH keyed by a fixed H, using 8-bit multiplication tables.
+
+    Parameters:
+        h: The hash key H = AES_K(0^128), as a 16-byte string or a 128-bit integer.
+
+    For every byte position j, a table holds the products with H of all 256 elements
+    whose only nonzero byte is at position j. Since multiplication is linear, x * H is
+    then the XOR of 16 table lookups, one per byte of x, with no reduction step. The
+    tables (4096 entries) are built from the 128 multiples x^i * H with XORs only.
+    """
+
+    def __init__(self, h):
+        if not isinstance(h, int):
+            h = b2i(h)
+        self.h = h
+        tables = []
+        v = h
+        for _ in range(16):
+            # v = H * x^(8j) here, and the table for byte j starts from its top bit
+            bits = []
+            for _ in range(8):
+                bits.append(v)
+                v = (v >> 1) ^ _R if v & 1 else v >> 1
+            table = [0]
+            for b in reversed(bits):
+                table += [t ^ b for t in table]
+            tables.append(table)
+        self._tables = tables
+
+    def mul(self, x):
+        """Multiply a 128-bit integer by H."""
+        z = 0
+        for table, b in zip(self._tables, x.to_bytes(16, 'big')):
+            z ^= table[b]
+        return z
+
+    def update(self, y, data):
+        """Absorb zero-padded `data` into the GHASH state `y` and return the new state."""
+        mul = self.mul
+        for block in gcm_unpack(data, field=False):
+            y = mul(y ^ block)
+        return y
+
+    def digest(self, aad=b'', ct=b''):
+        """Compute GHASH_H(aad, ct) as a 16-byte string.
+
+        The AES-GCM tag is this digest XORed with the encrypted initial counter block.
+        """
+        y = self.update(self.update(0, aad), ct)
+        lengths = (8 * len(aad)) << 64 | 8 * len(ct)
+        y = self.mul(y ^ lengths)
+        return y.to_bytes(16, 'big')
+
+
+@lru_cache(maxsize=32)
+def _ghash_key(h):
+    return GHash(h)
+
+def ghash(h, aad=b'', ct=b''):
+    """Compute GHASH_H(aad, ct) without Sage, see GHash.
+
+    The tables for the most recently used hash keys are kept between calls.
+    """
+    if not isinstance(h, int):
+        h = b2i(h)
+    return _ghash_key(h).digest(aad, ct)
+
+
+def _tag_poly(aad, ct, tag):
+    """Return the polynomial GHASH(X) + tag, whose constant term is the tag.
+
+    For the blocks B_1, ..., B_n of the GHASH input (including the length block),
+    GHASH(H) = B_1 H^n + ... + B_n H, and tag = GHASH(H) + E_K(J0). The difference of
+    two such polynomials under the same key and nonce therefore vanishes at H.
+    """
+    R, _ = gobj()
+    lengths = (8 * len(aad)) << 64 | 8 * len(ct)
+    blocks = gcm_unpack(aad) + gcm_unpack(ct) + [i2gcm(lengths)]
+    return R([i2gcm(b2i(tag))] + blocks[::-1])
+
+def gcm_nonce_reuse(messages):
+    """Recover the GHASH key from AES-GCM messages that reuse a nonce (the "forbidden
+    attack"). Requires Sage.
+
+    Parameters:
+        messages: At least two (aad, ct, tag) triples encrypted under the same key and
+        nonce.
+
+    Every pair of messages gives a polynomial with H as a root. Starting from the
+    shortest messages, their gcd is taken until its degree drops to 1 (or the messages
+    run out), so only that gcd has to be factored. The roots are then checked against
+    every message, using GHash without Sage.
+
+    Returns a list of candidates (H, mask), as 16-byte strings. The tag of any message
+    under that key and nonce is ghash(H, aad, ct) XOR mask. With only two messages,
+    there may be several candidates.
+
+    References:
+        - https://eprint.iacr.org/2016/475
+    """
+    if len(messages) < 2:
+        raise ValueError('at least two messages are needed')
+    messages = sorted(messages, key=lambda m: len(m[0]) + len(m[1]))
+    base = _tag_poly(*messages[0])
+    g = None
+    for m in messages[1:]:
+        f = base - _tag_poly(*m)
+        if f.is_zero():
+            continue
+        g = f if g is None else g.gcd(f)
+        if g.degree() <= 1:
+            break
+    if g is None:
+        raise ValueError('the messages must differ')
+    candidates = []
+    for root in g.roots(multiplicities=False):
+        h = gcm2i(root)
+        aad, ct, tag = messages[0]
+        mask = b2i(ghash(h, aad, ct)) ^ b2i(tag)
+        if all(b2i(ghash(h, a, c)) ^ mask == b2i(t) for a, c, t in messages[1:]):
+            candidates.append((i2b(h, 16), i2b(mask, 16)))
+    return candidates
@@ -4,4 +4,30 @@ from crypy.hash.md5 import MD5
 from crypy.hash.sha1 import SHA1
 from crypy.hash.sha256 import SHA224, SHA256
 from crypy.hash.sha512 import SHA384, SHA512
+from crypy.hash.search import *
 from crypy.hash.util import *
+
+__all__ = [
+    'CollisionResult',
+    'HashAlgorithm',
+    'MD4',
+    'MD5',
+    'PowResult',
+    'PrefixCache',
+    'SHA1',
+    'SHA224',
+    'SHA256',
+    'SHA384',
+    'SHA512',
+    'collide',
+    'extend_truncated',
+    'md2',
+    'md4',
+    'md5',
+    'pow_search',
+    'sha1',
+    'sha224',
+    'sha256',
+    'sha384',
+    'sha512',
+]
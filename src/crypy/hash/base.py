@@ -1,4 +1,8 @@
-from struct import pack, unpack
+from struct import calcsize, iter_unpack, pack, unpack
+import os
+from crypy.hash.openssl import load_transform, load_transform_states
+
+__all__ = ['HashAlgorithm']
 
 
 class HashAlgorithm:
@@ -6,6 +10,122 @@ class HashAlgorithm:
     block_size = 64
     length_padding_bytes = 8
     endian = 'big'
+    word_size = 32
+    openssl_name = None
+    _native = None
+    _native_states = None
+    _compress_words = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if '_compress_source' in cls.__dict__:
+            order = '<' if cls.endian == 'little' else '>'
+            cls.block_fmt = f'{order}{cls.block_size * 8 // cls.word_size}{cls.pack_fmt[-1]}'
+            source = '\n'.join([
+                cls._compress_source(),
+                'def compress(data, state):',
+                f'    return compress_words(unpack({cls.block_fmt!r}, data), state)',
+            ])
+            namespace = {'unpack': unpack}
+            exec(compile(source, f'<{cls.__name__}.compress>', 'exec'), namespace)
+            namespace['compress'].__qualname__ = f'{cls.__name__}.compress'
+            namespace['compress_words'].__qualname__ = f'{cls.__name__}._compress_words'
+            cls.compress = staticmethod(namespace['compress'])
+            cls._compress_words = staticmethod(namespace['compress_words'])
+        elif 'compress' in cls.__dict__:
+            # A hand-written compress() replaces the generated and native backends
+            cls._compress_words = None
+            cls._native = cls._native_states = None
+        if cls.__dict__.get('openssl_name') is not None:
+            state_fmt = f'={len(cls.init_state)}{cls.pack_fmt[-1]}'
+            cls._native = load_transform(cls.openssl_name, state_fmt, cls.block_size)
+            cls._native_states = load_transform_states(
+                cls.openssl_name, state_fmt, cls.block_size
+            )
+
+    def __init__(self, data=b'', state=None, count=0):
+        """Create a streaming hasher, optionally resuming from a chaining state.
+
+        Parameters:
+            data: Initial data to hash.
+            state: The chaining state to start from (the initial state by default).
+            count: The number of bytes already compressed into `state`. This must be a
+            multiple of the block size, since partial blocks are not part of the state.
+        """
+        if count % self.block_size != 0:
+            raise ValueError('count must be a multiple of the block size')
+        self._state = tuple(self.init_state if state is None else state)
+        self._count = count
+        self._buffer = bytearray()
+        self.update(data)
+
+    @classmethod
+    def new(cls, data=b''):
+        """Create a streaming hasher, analogous to `hashlib.new`."""
+        return cls(data)
+
+    @classmethod
+    def from_state(cls, state, count):
+        """Create a streaming hasher that resumes from `state` after `count` bytes."""
+        return cls(state=state, count=count)
+
+    def update(self, data):
+        """Feed more data into the hasher. Only full blocks are compressed.
+
+        Any bytes-like object is accepted, including memoryviews and mmaps. Blocks are
+        unpacked directly from it, and only a partial final block is copied.
+        """
+        view = memoryview(data).cast('B')
+        self._count += len(view)
+        bs = self.block_size
+        if self._buffer:
+            take = bs - len(self._buffer)
+            self._buffer += view[:take]
+            view = view[take:]
+            if len(self._buffer) < bs:
+                return self
+            self._state = self._transform(self._buffer, self._state)
+            self._buffer = bytearray()
+        end = len(view) - len(view) % bs
+        self._state = self._transform(view[:end], self._state)
+        self._buffer += view[end:]
+        return self
+
+    def copy(self):
+        """Return a copy of the hasher, e.g. to fork a common prefix."""
+        other = type(self).__new__(type(self))
+        other._state = self._state
+        other._count = self._count
+        other._buffer = self._buffer[:]
+        return other
+
+    def digest(self):
+        """Return the digest of the data fed so far, without altering the hasher."""
+        tail = bytes(self._buffer) + self.make_padding(self._count)
+        return self.compress_blocks(tail, self._state)
+
+    def hexdigest(self):
+        return self.digest().hex()
+
+    def update_file(self, file, chunk_size=1 << 20):
+        """Feed a file into the hasher, given by path or as a binary file object.
+
+        The file is read into a single reusable buffer, so memory use does not depend
+        on the size of the file.
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'rb') as f:
+                return self.update_file(f, chunk_size)
+        chunk_size = max(chunk_size - chunk_size % self.block_size, self.block_size)
+        buf = bytearray(chunk_size)
+        view = memoryview(buf)
+        while n := file.readinto(buf):
+            self.update(view[:n])
+        return self
+
+    def midstate(self):
+        """Return (state, count), the chaining state after the last full block."""
+        return (self._state, self._count - len(self._buffer))
 
     @classmethod
     def make_padding(cls, n, offset=0):
@@ -20,17 +140,176 @@ class HashAlgorithm:
 
     @classmethod
     def hash(cls, data):
-        return cls.compress_blocks(cls.pad(data))
+        return cls(data).digest()
+
+    @classmethod
+    def hash_file(cls, file, chunk_size=1 << 20):
+        """Hash a file given by path or as a binary file object, in constant memory."""
+        return cls().update_file(file, chunk_size).digest()
 
     @classmethod
     def compress_blocks(cls, data, state=None):
         assert len(data) % cls.block_size == 0
         if state is None:
             state = cls.init_state
-        for i in range(0, len(data), cls.block_size):
-            block = data[i:i+cls.block_size]
-            state = cls.compress(block, state)
-        return cls.finalize(state)
+        return cls.finalize(cls._transform(memoryview(data), state))
+
+    @classmethod
+    def compress_blocks_states(cls, data, states):
+        """Compress the same blocks into each of many chaining states.
+
+        Returns an iterator over the digests, matching compress_blocks() on each state.
+        The native backend reuses one hash context and one copy of `data` throughout,
+        which avoids most of the per-call overhead of compress_blocks().
+        """
+        assert len(data) % cls.block_size == 0
+        if cls._native is None:
+            return (cls.compress_blocks(data, state) for state in states)
+        return map(cls.finalize, cls._native_states(data, states))
+
+    @classmethod
+    def backend(cls):
+        """Return the backend used for compress_blocks(): 'openssl' or 'python'.
+
+        The native backend is used whenever libcrypto exports a `*_Transform` function
+        for this hash (see crypy.hash.openssl). compress() is always pure Python.
+        """
+        return 'python' if cls._native is None else 'openssl'
+
+    @classmethod
+    def _transform(cls, data, state):
+        """Compress every block of `data` into `state` using the active backend."""
+        if cls._native is not None:
+            return cls._native(data, state)
+        compress_words = cls._compress_words
+        if compress_words is None:
+            bs = cls.block_size
+            for i in range(0, len(data), bs):
+                state = cls.compress(data[i:i+bs], state)
+            return state
+        for words in iter_unpack(cls.block_fmt, data):
+            state = compress_words(words, state)
+        return state
+
+    @classmethod
+    def compress(cls, data, state):
+        """Compress a single block into the chaining state `state`.
+
+        Subclasses may implement this directly, and it is then called once per block.
+        The built-in hashes instead define a classmethod `_compress_source` returning
+        the source of a straight-line, fully unrolled `compress_words(X, state)`
+        function taking the unpacked words of the block. It is compiled when the class
+        is created, along with this wrapper, and blocks are unpacked in bulk for it.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def _rol_source(cls, x, n):
+        """Return source rotating `x` left by `n` bits, leaving garbage above the word.
+
+        The result must be masked after being combined with other terms.
+        """
+        return f'({x} << {n} | {x} >> {cls.word_size - n})'
+
+    @classmethod
+    def hash_many(cls, messages):
+        """Hash many messages at once using the lane-parallel engine (needs NumPy).
+
+        Messages are grouped by padded length, and each group is compressed in a
+        single pass of compress_many(). Returns a list of digests in the same order.
+        """
+        digests = [None] * len(messages)
+        groups = {}
+        for i, msg in enumerate(messages):
+            n = len(msg)
+            groups.setdefault(n + len(cls.make_padding(n)), []).append(i)
+        for idx in groups.values():
+            padded = [cls.pad(messages[i]) for i in idx]
+            for i, h in zip(idx, cls.compress_blocks_many(padded)):
+                digests[i] = h
+        return digests
+
+    @classmethod
+    def compress_blocks_many(cls, data, states=None):
+        """Compress N padded messages of equal length in parallel (needs NumPy).
+
+        Parameters:
+            data: A sequence of N byte strings, or an (N, L) uint8 array.
+            states: An (N, k) array of chaining states (the initial state by default).
+
+        Returns a list of N digests, matching compress_blocks() on each message.
+        """
+        import numpy as np
+
+        if not isinstance(data, np.ndarray):
+            if not data:
+                return []
+            data = np.frombuffer(b''.join(data), dtype=np.uint8).reshape(len(data), -1)
+        assert data.shape[1] % cls.block_size == 0
+        states = cls._states_many(states, data.shape[0])
+        for i in range(0, data.shape[1], cls.block_size):
+            states = cls.compress_many(data[:, i:i+cls.block_size], states)
+        return cls.finalize_many(states)
+
+    @classmethod
+    def compress_many(cls, blocks, states):
+        """Compress one block for each of N independent messages at once.
+
+        Parameters:
+            blocks: A sequence of N blocks, or an (N, block_size) uint8 array.
+            states: An (N, k) array of chaining states, or None for the initial state.
+
+        Each of the k state words is held in a NumPy array of N lanes, and the rounds
+        of compress() are applied to all lanes together. Returns the new (N, k) states.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def finalize_many(cls, states):
+        """Convert an (N, k) array of states to a list of N digests."""
+        import numpy as np
+
+        digest_size = calcsize(cls.pack_fmt)
+        raw = np.ascontiguousarray(states, dtype=cls._lane_dtype(cls.pack_fmt[0]))
+        raw = raw.view(np.uint8)[:, :digest_size].tobytes()
+        return [raw[i:i+digest_size] for i in range(0, len(raw), digest_size)]
+
+    @classmethod
+    def _lane_dtype(cls, order='='):
+        import numpy as np
+
+        return np.dtype(f'{order}u{cls.word_size // 8}')
+
+    @classmethod
+    def _unpack_many(cls, blocks):
+        """Unpack N blocks into a (words_per_block, N) array, one row per word."""
+        import numpy as np
+
+        if not isinstance(blocks, np.ndarray):
+            blocks = np.frombuffer(b''.join(blocks), dtype=np.uint8)
+        words = np.ascontiguousarray(blocks, dtype=np.uint8).view(
+            cls._lane_dtype('<' if cls.endian == 'little' else '>')
+        )
+        words = words.reshape(-1, cls.block_size * 8 // cls.word_size)
+        return np.ascontiguousarray(words.T, dtype=cls._lane_dtype())
+
+    @classmethod
+    def _states_many(cls, states, n):
+        import numpy as np
+
+        if states is None:
+            states = [cls.init_state] * n
+        return np.array(states, dtype=cls._lane_dtype()).reshape(n, -1)
+
+    @staticmethod
+    def _rol_many(x, n):
+        """Rotate an array of unsigned words to the left by `n` bits."""
+        return (x << n) | (x >> (x.dtype.itemsize * 8 - n))
+
+    @staticmethod
+    def _ror_many(x, n):
+        """Rotate an array of unsigned words to the right by `n` bits."""
+        return (x >> n) | (x << (x.dtype.itemsize * 8 - n))
 
     @classmethod
     def finalize(cls, state):
@@ -55,7 +334,7 @@ class HashAlgorithm:
         generated padding based on `msglen`, and `suffix`.
 
         Note: Truncated hashes like SHA-224 are susceptible to length extension but
-        require substantial amounts of brute force, so they are not implemented here.
+        require substantial amounts of brute force, see crypy.hash.extend_truncated().
 
         References:
             - https://en.wikipedia.org/wiki/Length_extension_attack
@@ -63,5 +342,32 @@ class HashAlgorithm:
         state = cls.unfinalize(h)
         padding = cls.make_padding(msglen)
         append = padding + suffix
-        new_h = cls.compress_blocks(cls.pad(suffix, msglen + len(padding)), state)
+        new_h = cls.from_state(state, msglen + len(padding)).update(suffix).digest()
         return (new_h, append)
+
+    @classmethod
+    def extend_range(cls, h, msglens, suffix=b''):
+        """Perform length extension attacks for many candidate message lengths.
+
+        Parameters:
+            h: The hash digest of the original message.
+            msglens: An iterable of candidate lengths of the original message.
+            suffix: The suffix of the appended data in the new message.
+
+        Lazily yields (msglen, new_h, append) for each candidate, as returned by
+        extend(). Useful when the length of a secret prefix is unknown.
+
+        The full blocks of `suffix` are compressed only once. After that, new_h only
+        depends on where the original padding ends, so candidates whose padding lands
+        on the same block boundary share a single finalization.
+        """
+        base = cls(state=cls.unfinalize(h)).update(suffix)
+        cache = {}
+        for msglen in msglens:
+            padding = cls.make_padding(msglen)
+            offset = msglen + len(padding)
+            if offset not in cache:
+                tail = base.copy()
+                tail._count += offset
+                cache[offset] = tail.digest()
+            yield (msglen, cache[offset], padding + suffix)
@@ -1,12 +1,11 @@
-from struct import unpack
 from crypy.hash.base import HashAlgorithm
-from crypy.util import rol32, cu32
 
 
 class MD4(HashAlgorithm):
     """Message-Digest Algorithm (MD4), 1990"""
     endian = 'little'
     pack_fmt = '<4I'
+    openssl_name = 'MD4'
     init_state = (0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476)
 
     S = (
@@ -21,9 +20,37 @@ class MD4(HashAlgorithm):
     )
 
     @classmethod
-    def compress(cls, data, state):
-        X = unpack('<16I', data)
-        A, B, C, D = state
+    def _compress_source(cls):
+        lines = [
+            'def compress_words(X, state):',
+            f'    {", ".join(f"X{j}" for j in range(16))} = X',
+            '    A, B, C, D = state',
+        ]
+        a, b, c, d = 'ABCD'
+        for i in range(48):
+            match i // 16:
+                case 0:
+                    E = f'(({b} & {c}) | (~{b} & {d}))'
+                case 1:
+                    E = f'(({b} & {c}) | ({b} & {d}) | ({c} & {d})) + 0x5A827999'
+                case 2:
+                    E = f'({b} ^ {c} ^ {d}) + 0x6ED9EBA1'
+            lines.append(f'    {a} = ({a} + {E} + X{cls.J[i]}) & 0xffffffff')
+            lines.append(f'    {a} = {cls._rol_source(a, cls.S[i])} & 0xffffffff')
+            a, b, c, d = d, a, b, c
+        lines.append(
+            f'    return ((state[0] + {a}) & 0xffffffff, (state[1] + {b}) & 0xffffffff, '
+            f'(state[2] + {c}) & 0xffffffff, (state[3] + {d}) & 0xffffffff)'
+        )
+        return '\n'.join(lines)
+
+    @classmethod
+    def compress_many(cls, blocks, states):
+        import numpy as np
+
+        X = cls._unpack_many(blocks)
+        states = cls._states_many(states, X.shape[1])
+        A, B, C, D = states.T
         for i in range(48):
             match i // 16:
                 case 0:
@@ -32,14 +59,9 @@ class MD4(HashAlgorithm):
                     E = cls.G(B, C, D) + 0x5A827999
                 case 2:
                     E = cls.H(B, C, D) + 0x6ED9EBA1
-            t = rol32(A + E + X[cls.J[i]], cls.S[i])
+            t = cls._rol_many(A + E + X[cls.J[i]], cls.S[i])
             A, B, C, D = D, t, B, C
-        return (
-            cu32(state[0] + A),
-            cu32(state[1] + B),
-            cu32(state[2] + C),
-            cu32(state[3] + D),
-        )
+        return states + np.stack((A, B, C, D), axis=1)
 
     @staticmethod
     def F(x, y, z):
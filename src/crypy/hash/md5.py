@@ -1,12 +1,11 @@
-from struct import unpack
 from crypy.hash.base import HashAlgorithm
-from crypy.util import rol32, cu32
 
 
 class MD5(HashAlgorithm):
     """Message-Digest Algorithm (MD5), 1992"""
     endian = 'little'
     pack_fmt = '<4I'
+    openssl_name = 'MD5'
     init_state = (0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476)
 
     S = (
@@ -35,9 +34,43 @@ class MD5(HashAlgorithm):
     )
 
     @classmethod
-    def compress(cls, data, state):
-        X = unpack('<16I', data)
-        A, B, C, D = state
+    def _compress_source(cls):
+        lines = [
+            'def compress_words(X, state):',
+            f'    {", ".join(f"X{j}" for j in range(16))} = X',
+            '    A, B, C, D = state',
+        ]
+        a, b, c, d = 'ABCD'
+        for i in range(64):
+            match i // 16:
+                case 0:
+                    E = f'(({b} & {c}) | (~{b} & {d}))'
+                    k = i
+                case 1:
+                    E = f'(({b} & {d}) | ({c} & ~{d}))'
+                    k = (i * 5 + 1) % 16
+                case 2:
+                    E = f'({b} ^ {c} ^ {d})'
+                    k = (i * 3 + 5) % 16
+                case 3:
+                    E = f'({c} ^ ({b} | ~{d}))'
+                    k = (i * 7) % 16
+            lines.append(f'    {a} = ({a} + {E} + {cls.K[i]:#010x} + X{k}) & 0xffffffff')
+            lines.append(f'    {a} = ({b} + {cls._rol_source(a, cls.S[i])}) & 0xffffffff')
+            a, b, c, d = d, a, b, c
+        lines.append(
+            f'    return ((state[0] + {a}) & 0xffffffff, (state[1] + {b}) & 0xffffffff, '
+            f'(state[2] + {c}) & 0xffffffff, (state[3] + {d}) & 0xffffffff)'
+        )
+        return '\n'.join(lines)
+
+    @classmethod
+    def compress_many(cls, blocks, states):
+        import numpy as np
+
+        X = cls._unpack_many(blocks)
+        states = cls._states_many(states, X.shape[1])
+        A, B, C, D = states.T
         for i in range(64):
             match i // 16:
                 case 0:
@@ -52,14 +85,9 @@ class MD5(HashAlgorithm):
                 case 3:
                     E = cls.I(B, C, D)
                     k = (i * 7) % 16
-            t = rol32(A + E + cls.K[i] + X[k], cls.S[i])
-            A, B, C, D = D, cu32(B + t), B, C
-        return (
-            cu32(state[0] + A),
-            cu32(state[1] + B),
-            cu32(state[2] + C),
-            cu32(state[3] + D),
-        )
+            t = cls._rol_many(A + E + cls.K[i] + X[k], cls.S[i])
+            A, B, C, D = D, B + t, B, C
+        return states + np.stack((A, B, C, D), axis=1)
 
     @staticmethod
     def F(x, y, z):
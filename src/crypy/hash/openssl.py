@@ -0,0 +1,80 @@
+"""Optional native compression functions from the system libcrypto.
+
+OpenSSL exports low-level `*_Transform` functions, which compress a single block into
+the chaining state stored at the start of a hash context. Unlike `hashlib`, they let us
+start from an arbitrary state, which is exactly what HashAlgorithm needs.
+
+The library is loaded by crypy._libcrypto, see there for how it is located.
+"""
+from struct import pack_into, unpack_from
+import ctypes
+from crypy._libcrypto import load_libcrypto
+
+# Large enough for any of the MD4/MD5/SHA/SHA256/SHA512 contexts
+_CTX_SIZE = 256
+# Data is copied into native memory in chunks of this size
+_CHUNK_SIZE = 1 << 16
+
+def _load_transform(name):
+    """Return OpenSSL's `<name>_Transform` with its signature declared, or None."""
+    lib = load_libcrypto()
+    if lib is None:
+        return None
+    try:
+        transform = getattr(lib, f'{name}_Transform')
+    except AttributeError:
+        return None
+    transform.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    transform.restype = None
+    return transform
+
+def load_transform(name, state_fmt, block_size):
+    """Load OpenSSL's `<name>_Transform` as a multi-block compression function.
+
+    Parameters:
+        name: The OpenSSL name of the hash, e.g. 'MD5' or 'SHA256'.
+        state_fmt: The struct format of the chaining state in the hash context.
+        block_size: The block size of the hash in bytes.
+
+    Returns a function f(data, state) that compresses every block of `data` into
+    `state` and returns the new state, or None if the function is not available.
+    """
+    transform = _load_transform(name)
+    if transform is None:
+        return None
+
+    def compress_blocks(data, state):
+        ctx = ctypes.create_string_buffer(_CTX_SIZE)
+        pack_into(state_fmt, ctx, 0, *state)
+        for i in range(0, len(data), _CHUNK_SIZE):
+            chunk = bytes(data[i:i+_CHUNK_SIZE])
+            addr = ctypes.cast(ctypes.c_char_p(chunk), ctypes.c_void_p).value
+            for j in range(0, len(chunk), block_size):
+                transform(ctx, addr + j)
+        return unpack_from(state_fmt, ctx, 0)
+
+    return compress_blocks
+
+def load_transform_states(name, state_fmt, block_size):
+    """Load OpenSSL's `<name>_Transform` to compress the same data into many states.
+
+    Takes the same parameters as load_transform(). Returns a function f(data, states)
+    yielding the new state for each of `states`, or None if the function is not
+    available. A single hash context and native copy of `data` are reused throughout.
+    """
+    transform = _load_transform(name)
+    if transform is None:
+        return None
+
+    def compress_states(data, states):
+        ctx = ctypes.create_string_buffer(_CTX_SIZE)
+        buf = ctypes.create_string_buffer(bytes(data), len(data))
+        start = ctypes.addressof(buf)
+        addrs = range(start, start + len(data), block_size)
+        for state in states:
+            pack_into(state_fmt, ctx, 0, *state)
+            for addr in addrs:
+                transform(ctx, addr)
+            yield unpack_from(state_fmt, ctx, 0)
+
+    return compress_states
@@ -1,29 +1,56 @@
-from struct import unpack
 from crypy.hash.base import HashAlgorithm
-from crypy.util import cu32, rol32
 
 
 class SHA1(HashAlgorithm):
     """Secure Hash Algorithm 1 (SHA-1), 1995"""
     pack_fmt = '>5I'
+    openssl_name = 'SHA1'
     init_state = (0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476, 0xC3D2E1F0)
 
     @classmethod
-    def compress(cls, data, state):
-        W = list(unpack('>16I', data))
+    def _compress_source(cls):
+        lines = [
+            'def compress_words(X, state):',
+            f'    {", ".join(f"W{t}" for t in range(16))} = X',
+        ]
         for t in range(16, 80):
-            W.append(rol32(W[t - 3] ^ W[t - 8] ^ W[t - 14] ^ W[t - 16], 1))
-        A, B, C, D, E = state
+            lines.append(f'    x = W{t - 3} ^ W{t - 8} ^ W{t - 14} ^ W{t - 16}')
+            lines.append(f'    W{t} = {cls._rol_source("x", 1)} & 0xffffffff')
+        lines.append('    A, B, C, D, E = state')
+        a, b, c, d, e = 'ABCDE'
         for t in range(80):
-            t = rol32(A, 5) + cls._f(t, B, C, D) + E + W[t] + cls._K(t)
-            A, B, C, D, E = t & 0xffffffff, A, rol32(B, 30), C, D
-        return (
-            cu32(state[0] + A),
-            cu32(state[1] + B),
-            cu32(state[2] + C),
-            cu32(state[3] + D),
-            cu32(state[4] + E),
+            if 0 <= t <= 19:
+                f = f'(({b} & {c}) | (~{b} & {d}))'
+            elif 40 <= t <= 59:
+                f = f'(({b} & {c}) | ({b} & {d}) | ({c} & {d}))'
+            else:
+                f = f'({b} ^ {c} ^ {d})'
+            lines.append(
+                f'    {e} = ({cls._rol_source(a, 5)} + {f} + {e} + W{t} + {cls._K(t):#010x})'
+                ' & 0xffffffff'
+            )
+            lines.append(f'    {b} = {cls._rol_source(b, 30)} & 0xffffffff')
+            a, b, c, d, e = e, a, b, c, d
+        lines.append(
+            f'    return ((state[0] + {a}) & 0xffffffff, (state[1] + {b}) & 0xffffffff, '
+            f'(state[2] + {c}) & 0xffffffff, (state[3] + {d}) & 0xffffffff, '
+            f'(state[4] + {e}) & 0xffffffff)'
         )
+        return '\n'.join(lines)
+
+    @classmethod
+    def compress_many(cls, blocks, states):
+        import numpy as np
+
+        W = list(cls._unpack_many(blocks))
+        states = cls._states_many(states, W[0].shape[0])
+        for t in range(16, 80):
+            W.append(cls._rol_many(W[t - 3] ^ W[t - 8] ^ W[t - 14] ^ W[t - 16], 1))
+        A, B, C, D, E = states.T
+        for t in range(80):
+            t = cls._rol_many(A, 5) + cls._f(t, B, C, D) + E + W[t] + cls._K(t)
+            A, B, C, D, E = t, A, cls._rol_many(B, 30), C, D
+        return states + np.stack((A, B, C, D, E), axis=1)
 
     @staticmethod
     def _f(t, B, C, D):
@@ -1,11 +1,11 @@
-from struct import unpack
 from crypy.hash.base import HashAlgorithm
-from crypy.util import cu32, ror32
+from crypy.util import ror32
 
 
 class SHA256(HashAlgorithm):
     """Secure Hash Algorithm 2 (SHA-256), 2001"""
     pack_fmt = '>8I'
+    openssl_name = 'SHA256'
     init_state = (
         0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a,
         0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
@@ -31,26 +31,64 @@ class SHA256(HashAlgorithm):
     )
 
     @classmethod
-    def compress(cls, data, state):
-        W = list(unpack('>16I', data))
+    def _compress_source(cls):
+        # Words are doubled up (x * (2^w + 1)) so that each right rotation is a single
+        # shift. The garbage left above the word is masked off after the additions.
+        lines = [
+            'def compress_words(X, state):',
+            f'    {", ".join(f"W{t}" for t in range(16))} = X',
+        ]
         for t in range(16, 64):
-            w = cls.SSIG1(W[t - 2]) + W[t - 7] + cls.SSIG0(W[t - 15]) + W[t - 16]
-            W.append(cu32(w))
-        a, b, c, d, e, f, g, h = state
+            lines.append(f'    x = W{t - 15} * 0x100000001')
+            lines.append(f'    y = W{t - 2} * 0x100000001')
+            s0 = f'(x >> 7 ^ x >> 18 ^ W{t - 15} >> 3)'
+            s1 = f'(y >> 17 ^ y >> 19 ^ W{t - 2} >> 10)'
+            lines.append(f'    W{t} = ({s1} + W{t - 7} + {s0} + W{t - 16})'
+                         ' & 0xffffffff')
+        lines.append('    a, b, c, d, e, f, g, h = state')
+        a, b, c, d, e, f, g, h = 'abcdefgh'
         for t in range(64):
-            T1 = cu32(h + cls.BSIG1(e) + cls.CH(e, f, g) + cls.K[t] + W[t])
-            T2 = cu32(cls.BSIG0(a) + cls.MAJ(a, b, c))
-            a, b, c, d, e, f, g, h = cu32(T1 + T2), a, b, c, cu32(d + T1), e, f, g
-        return (
-            cu32(state[0] + a),
-            cu32(state[1] + b),
-            cu32(state[2] + c),
-            cu32(state[3] + d),
-            cu32(state[4] + e),
-            cu32(state[5] + f),
-            cu32(state[6] + g),
-            cu32(state[7] + h),
+            ch = f'({g} ^ ({e} & ({f} ^ {g})))'
+            maj = f'(({a} & {b}) | ({c} & ({a} | {b})))'
+            lines.append(f'    x = {e} * 0x100000001')
+            lines.append(
+                f'    T1 = {h} + (x >> 6 ^ x >> 11 ^ x >> 25) + {ch} + '
+                f'{cls.K[t]:#010x} + W{t}'
+            )
+            lines.append(f'    {d} = ({d} + T1) & 0xffffffff')
+            lines.append(f'    x = {a} * 0x100000001')
+            lines.append(
+                f'    {h} = (T1 + (x >> 2 ^ x >> 13 ^ x >> 22) + {maj})'
+                ' & 0xffffffff'
+            )
+            a, b, c, d, e, f, g, h = h, a, b, c, d, e, f, g
+        regs = ', '.join(
+            f'(state[{i}] + {r}) & 0xffffffff'
+            for i, r in enumerate((a, b, c, d, e, f, g, h))
         )
+        lines.append(f'    return ({regs})')
+        return '\n'.join(lines)
+
+    @classmethod
+    def compress_many(cls, blocks, states):
+        import numpy as np
+
+        ror = cls._ror_many
+        W = list(cls._unpack_many(blocks))
+        states = cls._states_many(states, W[0].shape[0])
+        for t in range(16, 64):
+            x, y = W[t - 15], W[t - 2]
+            s0 = ror(x, 7) ^ ror(x, 18) ^ (x >> 3)
+            s1 = ror(y, 17) ^ ror(y, 19) ^ (y >> 10)
+            W.append(s1 + W[t - 7] + s0 + W[t - 16])
+        a, b, c, d, e, f, g, h = states.T
+        for t in range(64):
+            S1 = ror(e, 6) ^ ror(e, 11) ^ ror(e, 25)
+            S0 = ror(a, 2) ^ ror(a, 13) ^ ror(a, 22)
+            T1 = h + S1 + cls.CH(e, f, g) + cls.K[t] + W[t]
+            T2 = S0 + cls.MAJ(a, b, c)
+            a, b, c, d, e, f, g, h = T1 + T2, a, b, c, d + T1, e, f, g
+        return states + np.stack((a, b, c, d, e, f, g, h), axis=1)
 
     @staticmethod
     def CH(x, y, z):
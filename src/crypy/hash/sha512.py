@@ -1,13 +1,14 @@
-from struct import unpack
 from crypy.hash.base import HashAlgorithm
-from crypy.util import cu64, ror64
+from crypy.util import ror64
 
 
 class SHA512(HashAlgorithm):
     """Secure Hash Algorithm 2 (SHA-512), 2001"""
     block_size = 128
     length_padding_bytes = 16
+    word_size = 64
     pack_fmt = '>8Q'
+    openssl_name = 'SHA512'
     init_state = (
         0x6a09e667f3bcc908, 0xbb67ae8584caa73b, 0x3c6ef372fe94f82b, 0xa54ff53a5f1d36f1,
         0x510e527fade682d1, 0x9b05688c2b3e6c1f, 0x1f83d9abfb41bd6b, 0x5be0cd19137e2179,
@@ -37,26 +38,64 @@ class SHA512(HashAlgorithm):
     )
 
     @classmethod
-    def compress(cls, data, state):
-        W = list(unpack('>16Q', data))
+    def _compress_source(cls):
+        # Words are doubled up (x * (2^w + 1)) so that each right rotation is a single
+        # shift. The garbage left above the word is masked off after the additions.
+        lines = [
+            'def compress_words(X, state):',
+            f'    {", ".join(f"W{t}" for t in range(16))} = X',
+        ]
         for t in range(16, 80):
-            w = cls.SSIG1(W[t - 2]) + W[t - 7] + cls.SSIG0(W[t - 15]) + W[t - 16]
-            W.append(cu64(w))
-        a, b, c, d, e, f, g, h = state
+            lines.append(f'    x = W{t - 15} * 0x10000000000000001')
+            lines.append(f'    y = W{t - 2} * 0x10000000000000001')
+            s0 = f'(x >> 1 ^ x >> 8 ^ W{t - 15} >> 7)'
+            s1 = f'(y >> 19 ^ y >> 61 ^ W{t - 2} >> 6)'
+            lines.append(f'    W{t} = ({s1} + W{t - 7} + {s0} + W{t - 16})'
+                         ' & 0xffffffffffffffff')
+        lines.append('    a, b, c, d, e, f, g, h = state')
+        a, b, c, d, e, f, g, h = 'abcdefgh'
         for t in range(80):
-            T1 = cu64(h + cls.BSIG1(e) + cls.CH(e, f, g) + cls.K[t] + W[t])
-            T2 = cu64(cls.BSIG0(a) + cls.MAJ(a, b, c))
-            a, b, c, d, e, f, g, h = cu64(T1 + T2), a, b, c, cu64(d + T1), e, f, g
-        return (
-            cu64(state[0] + a),
-            cu64(state[1] + b),
-            cu64(state[2] + c),
-            cu64(state[3] + d),
-            cu64(state[4] + e),
-            cu64(state[5] + f),
-            cu64(state[6] + g),
-            cu64(state[7] + h),
+            ch = f'({g} ^ ({e} & ({f} ^ {g})))'
+            maj = f'(({a} & {b}) | ({c} & ({a} | {b})))'
+            lines.append(f'    x = {e} * 0x10000000000000001')
+            lines.append(
+                f'    T1 = {h} + (x >> 14 ^ x >> 18 ^ x >> 41) + {ch} + '
+                f'{cls.K[t]:#018x} + W{t}'
+            )
+            lines.append(f'    {d} = ({d} + T1) & 0xffffffffffffffff')
+            lines.append(f'    x = {a} * 0x10000000000000001')
+            lines.append(
+                f'    {h} = (T1 + (x >> 28 ^ x >> 34 ^ x >> 39) + {maj})'
+                ' & 0xffffffffffffffff'
+            )
+            a, b, c, d, e, f, g, h = h, a, b, c, d, e, f, g
+        regs = ', '.join(
+            f'(state[{i}] + {r}) & 0xffffffffffffffff'
+            for i, r in enumerate((a, b, c, d, e, f, g, h))
         )
+        lines.append(f'    return ({regs})')
+        return '\n'.join(lines)
+
+    @classmethod
+    def compress_many(cls, blocks, states):
+        import numpy as np
+
+        ror = cls._ror_many
+        W = list(cls._unpack_many(blocks))
+        states = cls._states_many(states, W[0].shape[0])
+        for t in range(16, 80):
+            x, y = W[t - 15], W[t - 2]
+            s0 = ror(x, 1) ^ ror(x, 8) ^ (x >> 7)
+            s1 = ror(y, 19) ^ ror(y, 61) ^ (y >> 6)
+            W.append(s1 + W[t - 7] + s0 + W[t - 16])
+        a, b, c, d, e, f, g, h = states.T
+        for t in range(80):
+            S1 = ror(e, 14) ^ ror(e, 18) ^ ror(e, 41)
+            S0 = ror(a, 28) ^ ror(a, 34) ^ ror(a, 39)
+            T1 = h + S1 + cls.CH(e, f, g) + cls.K[t] + W[t]
+            T2 = S0 + cls.MAJ(a, b, c)
+            a, b, c, d, e, f, g, h = T1 + T2, a, b, c, d + T1, e, f, g
+        return states + np.stack((a, b, c, d, e, f, g, h), axis=1)
 
     @staticmethod
     def CH(x, y, z):
@@ -1,7 +1,9 @@
 from Crypto.Hash import MD2, MD4
+from collections import OrderedDict
 import hashlib
 
 __all__ = [
+    'PrefixCache',
     'md2',
     'md4',
     'md5',
@@ -44,3 +46,82 @@ def sha384(s):
 def sha512(s):
     """Compute the SHA-512 hash of a message."""
     return hashlib.sha512(s).digest()
+
+
+_constructors = {
+    md2: MD2.new,
+    md4: MD4.new,
+    md5: hashlib.md5,
+    sha1: hashlib.sha1,
+    sha224: hashlib.sha224,
+    sha256: hashlib.sha256,
+    sha384: hashlib.sha384,
+    sha512: hashlib.sha512,
+}
+_constructors.update({f.__name__: new for f, new in _constructors.items()})
+
+def _hash_constructor(hashfunc):
+    """Return a constructor of streaming hash objects for `hashfunc`.
+
+    `hashfunc` may be a name like 'sha256', one of the one-shot functions in this
+    module, or already a constructor such as `hashlib.sha256` or `SHA256.new`.
+    """
+    if isinstance(hashfunc, str) and hashfunc not in _constructors:
+        return lambda data=b'': hashlib.new(hashfunc, data)
+    return _constructors.get(hashfunc, hashfunc)
+
+
+class PrefixCache:
+    """Size-bounded LRU cache of hash states after absorbing a common prefix.
+
+    Parameters:
+        hashfunc: The hash function (see below).
+        maxsize: The maximum number of prefixes to remember.
+
+    The hash function can be given by name ('sha256'), as one of the functions in this
+    module (sha256), or as any constructor of objects with update(), copy() and
+    digest(). This includes `hashlib` constructors and the pure classes in crypy.hash,
+    e.g. `SHA256`. Hashing prefix || suffix then only compresses the blocks of `suffix`.
+
+    >>> cache = PrefixCache(sha256)
+    >>> cache.hash(b'secret', b'guess') == sha256(b'secretguess')
+    True
+    """
+
+    def __init__(self, hashfunc, maxsize=128):
+        self.new = _hash_constructor(hashfunc)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self, prefix):
+        """Return a new hash object that has absorbed `prefix`."""
+        prefix = bytes(prefix)
+        h = self._cache.get(prefix)
+        if h is None:
+            self.misses += 1
+            h = self.new()
+            h.update(prefix)
+            self._cache[prefix] = h
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        else:
+            self.hits += 1
+            self._cache.move_to_end(prefix)
+        return h.copy()
+
+    def hash(self, prefix, suffix=b''):
+        """Compute the hash of prefix || suffix."""
+        h = self.get(prefix)
+        h.update(suffix)
+        return h.digest()
+
+    def clear(self):
+        """Forget all cached prefixes."""
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
@@ -1,15 +1,20 @@
 from Crypto.Util.Padding import pad as _pad, unpad as _unpad
 from Crypto.Util.number import bytes_to_long, long_to_bytes
+import array
 import base64
 import struct
+import sys
 
 __all__ = [
+    'Words',
     'b2i',
     'b64d',
     'b64e',
     'b64ud',
     'b64ue',
     'brev',
+    'brev_bytes',
+    'brev_many',
     'ci',
     'ci8',
     'ci16',
@@ -21,6 +26,7 @@ __all__ = [
     'cu32',
     'cu64',
     'i2b',
+    'iter_unpacks',
     'pad',
     'rol',
     'rol8',
@@ -44,6 +50,7 @@ __all__ = [
     'unpacks',
     'unpad',
     'xor',
+    'xor_into',
     'xork',
     'zpad',
 ]
@@ -82,33 +89,103 @@ def zpad(data, block_size):
     """Pad a byte string with null bytes to the next multiple of `block_size`."""
     return data + b'\x00' * (-len(data) % block_size)
 
+# _BREV8[i] is the bit reversal of the byte i
+_BREV8 = bytes(int(f'{i:08b}'[::-1], 2) for i in range(256))
+
 def brev(x, word_size):
     """Compute the bit reversal of an integer `x` with `word_size` bits."""
     x &= ((1 << word_size) - 1)
-    return int(f'{x:0{word_size}b}'[::-1], 2)
+    num_bytes = (word_size + 7) // 8
+    # Reversing the bits of every byte and the order of the bytes reverses the whole
+    # (8 * num_bytes)-bit word, which is then shifted down to `word_size` bits.
+    y = int.from_bytes(x.to_bytes(num_bytes, 'little').translate(_BREV8), 'big')
+    return y >> (8 * num_bytes - word_size)
+
+def brev_bytes(data):
+    """Reverse the bits of every byte of a bytes-like object, returning bytes.
+
+    Reading the result as a little-endian integer gives the bit reversal of `data` read
+    as a big-endian integer, so a buffer of many words is reversed in a single pass.
+    """
+    return bytes(data).translate(_BREV8)
+
+def brev_many(xs, word_size):
+    """Compute the bit reversals of many integers with `word_size` bits.
+
+    `xs` is either a NumPy array of unsigned integers at least `word_size` bits wide,
+    in which case the result is an array of the same dtype, or a sequence of Python
+    integers of any word size, in which case the result is a list.
+    """
+    num_bytes = (word_size + 7) // 8
+    shift = 8 * num_bytes - word_size
+    mask = (1 << word_size) - 1
+    if hasattr(xs, 'dtype'):
+        import numpy as np
+
+        itemsize = xs.dtype.itemsize
+        if xs.dtype.kind != 'u' or word_size > 8 * itemsize:
+            raise ValueError('array dtype must be unsigned and `word_size` bits or wider')
+        table = np.frombuffer(_BREV8, dtype=np.uint8)
+        le = np.ascontiguousarray(xs & mask, dtype=xs.dtype.newbyteorder('<'))
+        rev = table[le.view(np.uint8).reshape(-1, itemsize)[:, ::-1]]
+        ys = np.ascontiguousarray(rev).view(le.dtype).reshape(xs.shape)
+        return (ys >> (8 * itemsize - word_size)).astype(xs.dtype)
+    # Pack everything into one buffer, so that a single translate() does all the work
+    data = brev_bytes(b''.join((x & mask).to_bytes(num_bytes, 'little') for x in xs))
+    return [
+        int.from_bytes(data[i:i+num_bytes], 'big') >> shift
+        for i in range(0, len(data), num_bytes)
+    ]
+
+# The bit primitives below also accept NumPy integer arrays. These are first cast to
+# the unsigned dtype of `word_size` bits, so that NumPy's wraparound arithmetic has
+# the right width. Other word sizes (below 64) use a masked uint64 array instead.
+
+def _array_cu(x, word_size):
+    """Cast a NumPy integer array to unsigned words of `word_size` bits."""
+    import numpy as np
+
+    if word_size in _struct_codes:
+        return x.astype(f'u{word_size // 8}')
+    if word_size > 64:
+        raise ValueError('`word_size` must be at most 64 for arrays')
+    return x.astype(np.uint64) & ((1 << word_size) - 1)
 
 def ci(x, word_size):
     """Cast `x` to an signed integer of `word_size` bits."""
+    if hasattr(x, 'dtype'):
+        import numpy as np
+
+        if word_size in _struct_codes:
+            return x.astype(f'i{word_size // 8}')
+        x = _array_cu(x, word_size).astype(np.int64)
+        return np.where(x >> (word_size - 1), x - (1 << word_size), x)
     x &= ((1 << word_size) - 1)
     return x - (1 << word_size) if x & (1 << (word_size - 1)) else x
 
 def cu(x, word_size):
     """Cast `x` to an unsigned integer of `word_size` bits."""
+    if hasattr(x, 'dtype'):
+        return _array_cu(x, word_size)
     return x & ((1 << word_size) - 1)
 
 def rol(x, n, word_size):
     """Rotate `x` to the left by `n` bits."""
     mask = (1 << word_size) - 1
     n %= word_size
+    if hasattr(x, 'dtype'):
+        x = _array_cu(x, word_size)
+        if hasattr(n, 'dtype'):
+            n = n.astype(x.dtype)
+        # Shifts by the full word size give 0 in NumPy, so n = 0 needs no special case
+        return (x << n | x >> (word_size - n)) & mask
     x &= mask
     return (x << n | x >> (word_size - n)) & mask
 
 def ror(x, n, word_size):
     """Rotate `x` to the right by `n` bits."""
-    mask = (1 << word_size) - 1
-    n %= word_size
-    x &= mask
-    return (x >> n | x << (word_size - n)) & mask
+    # Not rol(x, -n), since negating an unsigned array of counts wraps around
+    return rol(x, word_size - n % word_size, word_size)
 
 def unpack(s, word_size, endian='little', *, signed=False):
     """Unpack a byte string `s` to a single integer of `word_size` bits."""
@@ -118,19 +195,109 @@ def unpack(s, word_size, endian='little', *, signed=False):
         raise ValueError('byte string has incorrect length')
     return int.from_bytes(s, endian, signed=signed)
 
-def unpacks(s, word_size, endian='little', *, signed=False):
-    """Unpack a byte string `s` to multiple integers of `word_size` bits."""
+def unpacks(s, word_size, endian='little', *, signed=False, mode='list'):
+    """Unpack a byte string `s` to multiple integers of `word_size` bits.
+
+    The last integer is zero-padded if the length of `s` isn't a multiple of the word
+    size. The result is returned according to `mode`:
+        'list': A list of Python integers.
+        'array': An `array.array` of the matching type (8/16/32/64-bit words only).
+        'numpy': A NumPy array of the matching dtype and endianness (8/16/32/64-bit
+        words only). This is a view over `s` unless a padded tail is needed.
+    """
     if word_size % 8 != 0:
         raise ValueError('`word_size` must be a multiple of 8')
     num_bytes = word_size // 8
+    s = memoryview(s).cast('B')
     length = len(s)
-    s += b'\x00' * (-length % num_bytes)
+    if mode == 'numpy':
+        import numpy as np
+
+        if word_size not in _struct_codes:
+            raise ValueError('`word_size` must be 8, 16, 32 or 64 for arrays')
+        order = '<' if endian == 'little' else '>'
+        dtype = np.dtype(f'{order}{"i" if signed else "u"}{num_bytes}')
+        if length % num_bytes:
+            s = s.tobytes() + b'\x00' * (-length % num_bytes)
+        return np.frombuffer(s, dtype=dtype)
+    if mode == 'array':
+        code = _array_codes.get((num_bytes, signed))
+        if code is None:
+            raise ValueError('`word_size` must be 8, 16, 32 or 64 for arrays')
+        words = array.array(code)
+        if length % num_bytes:
+            s = s.tobytes() + b'\x00' * (-length % num_bytes)
+        words.frombytes(s)
+        if endian != sys.byteorder:
+            words.byteswap()
+        return words
+    if mode != 'list':
+        raise ValueError("`mode` must be one of 'list', 'array' or 'numpy'")
+    end = length - length % num_bytes
+    words = list(_unpack_words(s[:end], word_size, endian, signed))
+    if end < length:
+        tail = s[end:].tobytes() + b'\x00' * (-length % num_bytes)
+        words.append(int.from_bytes(tail, endian, signed=signed))
+    return words
+
+def iter_unpacks(f, word_size, endian='little', *, signed=False, chunk_size=1 << 16):
+    """Lazily unpack integers of `word_size` bits from a file object or buffer.
+
+    `f` is either a binary file object, which is read in chunks of `chunk_size` bytes
+    into a single reusable buffer, or a bytes-like object such as an mmap, which is
+    unpacked in slices of `chunk_size` bytes. As in unpacks(), the last integer is
+    zero-padded if needed.
+    """
+    if word_size % 8 != 0:
+        raise ValueError('`word_size` must be a multiple of 8')
     num_bytes = word_size // 8
+    chunk_size = max(chunk_size - chunk_size % num_bytes, num_bytes)
+    if hasattr(f, 'readinto'):
+        chunks = _read_chunks(f, chunk_size)
+    else:
+        view = memoryview(f).cast('B')
+        chunks = (view[i:i+chunk_size] for i in range(0, len(view), chunk_size))
+    rest = b''
+    for chunk in chunks:
+        if rest:
+            take = num_bytes - len(rest)
+            rest += chunk[:take].tobytes()
+            chunk = chunk[take:]
+            if len(rest) < num_bytes:
+                continue
+            yield int.from_bytes(rest, endian, signed=signed)
+        end = len(chunk) - len(chunk) % num_bytes
+        yield from _unpack_words(chunk[:end], word_size, endian, signed)
+        rest = chunk[end:].tobytes()
+    if rest:
+        rest += b'\x00' * (num_bytes - len(rest))
+        yield int.from_bytes(rest, endian, signed=signed)
+
+# struct and array type codes of the standard word sizes
+_struct_codes = {8: 'b', 16: 'h', 32: 'i', 64: 'q'}
+_array_codes = {}
+for _code in reversed('bBhHiIlLqQ'):
+    _array_codes[array.array(_code).itemsize, _code.islower()] = _code
+
+def _unpack_words(s, word_size, endian, signed):
+    """Unpack the integers in `s`, whose length is a multiple of the word size."""
+    num_bytes = word_size // 8
+    code = _struct_codes.get(word_size)
+    if code is not None:
+        order = '<' if endian == 'little' else '>'
+        code = code if signed else code.upper()
+        return struct.unpack(f'{order}{len(s) // num_bytes}{code}', s)
     return [
         int.from_bytes(s[i:i+num_bytes], endian, signed=signed)
-        for i in range(0, length, num_bytes)
+        for i in range(0, len(s), num_bytes)
     ]
 
+def _read_chunks(f, chunk_size):
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    while n := f.readinto(buf):
+        yield view[:n]
+
 # These are 8-, 16-, 32- and 64-bit versions of some routines
 ci8 = lambda x: ci(x, 8)
 ci16 = lambda x: ci(x, 16)
@@ -157,6 +324,112 @@ u16s = lambda s, *args, **kwargs: unpacks(s, 16, *args, **kwargs)
 u32s = lambda s, *args, **kwargs: unpacks(s, 32, *args, **kwargs)
 u64s = lambda s, *args, **kwargs: unpacks(s, 64, *args, **kwargs)
 
+
+class Words:
+    """A fixed-width array of unsigned words, backed by a NumPy array.
+
+    Arithmetic and bitwise operators act on all words at once and wrap around at
+    `word_size` bits, as do the rol() and ror() methods. Operands may be other Words,
+    integers or NumPy arrays (broadcast as usual). This is handy for reimplementing
+    ARX ciphers and PRNGs on whole state arrays:
+
+    >>> s = Words([1, 2, 0x80000000], 32)
+    >>> (s.rol(1) + 0xffffffff).tolist()
+    [1, 3, 0]
+    """
+
+    def __init__(self, values, word_size=32):
+        import numpy as np
+
+        if word_size not in _struct_codes:
+            raise ValueError('`word_size` must be 8, 16, 32 or 64')
+        self.word_size = word_size
+        if not hasattr(values, 'dtype'):
+            mask = (1 << word_size) - 1
+            values = np.array([v & mask for v in values], dtype=f'u{word_size // 8}')
+        self.array = _array_cu(values, word_size)
+
+    def _coerce(self, other):
+        if isinstance(other, Words):
+            return other.array
+        if isinstance(other, int):
+            return other & ((1 << self.word_size) - 1)
+        return _array_cu(other, self.word_size)
+
+    def _new(self, array):
+        return Words(array, self.word_size)
+
+    def __repr__(self):
+        return f'Words({self.tolist()}, {self.word_size})'
+
+    def __len__(self):
+        return len(self.array)
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __getitem__(self, idx):
+        item = self.array[idx]
+        return self._new(item) if item.ndim else int(item)
+
+    def __setitem__(self, idx, value):
+        self.array[idx] = self._coerce(value)
+
+    def __eq__(self, other):
+        if not isinstance(other, Words):
+            return NotImplemented
+        return self.word_size == other.word_size and self.tolist() == other.tolist()
+
+    def __add__(self, other):
+        return self._new(self.array + self._coerce(other))
+
+    def __sub__(self, other):
+        return self._new(self.array - self._coerce(other))
+
+    def __mul__(self, other):
+        return self._new(self.array * self._coerce(other))
+
+    def __xor__(self, other):
+        return self._new(self.array ^ self._coerce(other))
+
+    def __and__(self, other):
+        return self._new(self.array & self._coerce(other))
+
+    def __or__(self, other):
+        return self._new(self.array | self._coerce(other))
+
+    __radd__ = __add__
+    __rmul__ = __mul__
+    __rxor__ = __xor__
+    __rand__ = __and__
+    __ror__ = __or__
+
+    def __rsub__(self, other):
+        return self._new(self._coerce(other) - self.array)
+
+    def __invert__(self):
+        return self._new(~self.array)
+
+    def __neg__(self):
+        return self._new(-self.array)
+
+    def __lshift__(self, n):
+        return self._new(self.array << n)
+
+    def __rshift__(self, n):
+        return self._new(self.array >> n)
+
+    def rol(self, n):
+        """Rotate every word to the left by `n` bits (an integer or an array)."""
+        return self._new(rol(self.array, n, self.word_size))
+
+    def ror(self, n):
+        """Rotate every word to the right by `n` bits (an integer or an array)."""
+        return self._new(ror(self.array, n, self.word_size))
+
+    def tolist(self):
+        return self.array.tolist()
+
 def b64e(s):
     """Encode a string in Base64."""
     if isinstance(s, str):
@@ -195,26 +468,79 @@ def xork(*args):
     """
     return _xor_generic(args, lambda strs: max(len(s) for s in strs))
 
+def xor_into(out, *args):
+    """XOR multiple string or byte inputs into the writable buffer `out`.
+
+    Each input is cyclically extended to the length of `out`, as in xork(). `out` may
+    also be one of the inputs, e.g. xor_into(buf, buf, key) XORs `key` into `buf` in
+    place. Returns `out`.
+
+    With NumPy installed, the inputs are XORed into `out` in place, without building
+    the result or extending the inputs first. Otherwise the result is computed as in
+    xork() and copied into `out`.
+    """
+    out_view = memoryview(out).cast('B')
+    try:
+        import numpy as np
+    except ImportError:
+        out_view[:] = _xor_generic(args, lambda strs: len(out_view))
+        return out
+    n = len(out_view)
+    acc = np.frombuffer(out_view, dtype=np.uint8)
+    arrays = [np.frombuffer(_xor_view(s), dtype=np.uint8) for s in args]
+    if n == 0:
+        return out
+    if not arrays:
+        acc[:] = 0
+    # Later inputs that overlap `out` would be clobbered by the first one, so copy them
+    arrays[1:] = [a.copy() if np.may_share_memory(a, acc) else a for a in arrays[1:]]
+    for i, a in enumerate(arrays):
+        if len(a) == 0:
+            raise ValueError('cannot cyclically extend an empty string')
+        a = a[:n]
+        # Whole repetitions of the input broadcast over rows, the rest is a prefix
+        q = n - n % len(a)
+        rows, tail = acc[:q].reshape(-1, len(a)), acc[q:]
+        if i == 0:
+            # Nothing to copy when the first input is `out` itself, e.g. (buf, buf, key)
+            if len(a) < n or a.ctypes.data != acc.ctypes.data:
+                rows[:] = a
+                tail[:] = a[:len(tail)]
+        else:
+            rows ^= a
+            tail ^= a[:len(tail)]
+    return out
+
+def _xor_view(s):
+    """Return a byte view of a string, a bytes-like object or an iterable of ints."""
+    if isinstance(s, str):
+        return memoryview(s.encode())
+    try:
+        return memoryview(s).cast('B')
+    except TypeError:
+        return memoryview(bytes(s))
+
 def _xor_generic(args, cut_func):
     """XOR multiple string or byte inputs.
 
-    The function takes any number of string or bytes-like arguments. Each string is
-    cyclically padded to the length returned by `cut_func`.
+    The function takes any number of string or bytes-like arguments, or iterables of
+    ints. Each string is cyclically padded to the length returned by `cut_func`.
+
+    Rather than looping over bytes, each padded string is read as one big integer, so
+    that all the work happens in a handful of whole-buffer operations.
     """
     if not args:
         return b''
-    strs = []
-    for s in args:
-        if isinstance(s, str):
-            s = s.encode()
-        strs.append(bytes(s))
+    strs = [_xor_view(s) for s in args]
     n = cut_func(strs)
-    xored = bytearray(n)
+    xored = 0
     for s in strs:
-        j, m = 0, len(s)
-        for i in range(n):
-            xored[i] ^= s[j]
-            j += 1
-            if j == m:
-                j = 0
-    return bytes(xored)
+        m = len(s)
+        if m < n:
+            if m == 0:
+                raise ValueError('cannot cyclically extend an empty string')
+            s = (s.tobytes() * -(-n // m))[:n]
+        elif m > n:
+            s = s[:n]
+        xored ^= int.from_bytes(s, 'little')
+    return xored.to_bytes(n, 'little')
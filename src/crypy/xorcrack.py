@@ -0,0 +1,332 @@
+from typing import NamedTuple
+import math
+
+__all__ = [
+    'CribDragger',
+    'CribResult',
+    'english_freqs',
+    'xork_keylens',
+    'xork_solve',
+]
+
+
+def english_freqs():
+    """Return a 256-entry table of the approximate byte frequencies of English text."""
+    letters = {
+        'a': 8.2, 'b': 1.5, 'c': 2.8, 'd': 4.3, 'e': 12.7, 'f': 2.2, 'g': 2.0,
+        'h': 6.1, 'i': 7.0, 'j': 0.15, 'k': 0.77, 'l': 4.0, 'm': 2.4, 'n': 6.7,
+        'o': 7.5, 'p': 1.9, 'q': 0.095, 'r': 6.0, 's': 6.3, 't': 9.1, 'u': 2.8,
+        'v': 0.98, 'w': 2.4, 'x': 0.15, 'y': 2.0, 'z': 0.074,
+    }
+    total = sum(letters.values())
+    freqs = [1e-6] * 256
+    for c in range(0x20, 0x7f):
+        freqs[c] = 1e-4
+    for c, f in letters.items():
+        freqs[ord(c)] = 0.75 * f / total
+        freqs[ord(c.upper())] = 0.05 * f / total
+    freqs[ord(' ')] = 0.15
+    freqs[ord('\n')] = 0.01
+    for c in '.,\'"-!?;:()':
+        freqs[ord(c)] = 0.003
+    for c in '0123456789':
+        freqs[ord(c)] = 0.001
+    return freqs
+
+def _as_freqs(freqs):
+    """Convert `freqs` to a 256-entry table of log-probabilities."""
+    if freqs is None:
+        freqs = english_freqs()
+    elif isinstance(freqs, (bytes, bytearray, memoryview)):
+        # A sample text, counted with add-one smoothing
+        counts = [1] * 256
+        for c in bytes(freqs):
+            counts[c] += 1
+        freqs = counts
+    total = sum(freqs)
+    return [math.log(f / total) for f in freqs]
+
+def _as_arrays(ct):
+    """Return one or many ciphertexts as a list of uint8 arrays, without copying."""
+    import numpy as np
+
+    if isinstance(ct, (bytes, bytearray, memoryview, str)):
+        ct = [ct]
+    return [np.frombuffer(c.encode() if isinstance(c, str) else c, dtype=np.uint8)
+            for c in ct]
+
+def _pool(arrays):
+    """Concatenate arrays into (data, pos), where pos[i] is the index of data[i] within
+    its own array.
+    """
+    import numpy as np
+
+    lengths = np.array([len(a) for a in arrays], dtype=np.intp)
+    data = np.concatenate(arrays) if arrays else np.zeros(0, dtype=np.uint8)
+    pos = np.arange(len(data)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return data, pos
+
+def _sample(arrays, size):
+    """Return the first `size` bytes of the ciphertexts as a list of arrays."""
+    out = []
+    for a in arrays:
+        if size <= 0:
+            break
+        out.append(a[:size])
+        size -= len(a)
+    return out
+
+def _column_counts(arrays, keylen):
+    """Return a (keylen, 256) array of byte counts for each column of the ciphertexts.
+
+    Long ciphertexts are counted one strided column at a time, and short ones are
+    pooled into a single bincount, so neither case loops over bytes in Python.
+    """
+    import numpy as np
+
+    counts = np.zeros(keylen * 256, dtype=np.int64)
+    short = []
+    for a in arrays:
+        if len(a) < 256 * keylen:
+            short.append(a)
+            continue
+        for j in range(keylen):
+            counts[j*256:(j+1)*256] += np.bincount(a[j::keylen], minlength=256)
+    if short:
+        data, pos = _pool(short)
+        counts += np.bincount(pos % keylen * 256 + data, minlength=keylen * 256)
+    return counts.reshape(keylen, 256)
+
+def xork_keylens(ct, max_keylen=40, method='hamming', sample=1 << 16):
+    """Rank the likely key lengths of repeating-key XOR ciphertext(s).
+
+    Parameters:
+        ct: A ciphertext, or a list of ciphertexts encrypted with the same key.
+        max_keylen: The largest key length to consider.
+        method: 'hamming' or 'ioc' (see below).
+        sample: The number of ciphertext bytes to analyse, from the start.
+
+    With 'hamming', the score is the normalised Hamming distance between bytes that are
+    `keylen` apart, which is smallest for the right key length since the key cancels
+    out. With 'ioc', the score is the negated mean index of coincidence of the columns.
+    Returns a list of (keylen, score), best (lowest score) first. Multiples of the key
+    length score about as well as the key length itself.
+    """
+    import numpy as np
+
+    if method not in ('hamming', 'ioc'):
+        raise ValueError("method must be 'hamming' or 'ioc'")
+    arrays = _sample(_as_arrays(ct), sample)
+    data, pos = _pool(arrays)
+    popcount = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+    scores = []
+    for keylen in range(1, max_keylen + 1):
+        if method == 'hamming':
+            # Only compare bytes within the same ciphertext
+            same = pos[keylen:] == pos[:-keylen] + keylen
+            if not same.any():
+                break
+            diff = popcount[data[keylen:][same] ^ data[:-keylen][same]]
+            scores.append((keylen, float(diff.mean()) / 8))
+        else:
+            counts = _column_counts(arrays, keylen).astype(np.float64)
+            n = counts.sum(axis=1)
+            if not (n > 1).any():
+                break
+            coincidences = (counts * (counts - 1)).sum(axis=1)[n > 1]
+            n = n[n > 1]
+            scores.append((keylen, -float((coincidences / (n * (n - 1))).mean())))
+    return sorted(scores, key=lambda s: s[1])
+
+def _min_period(key):
+    """Reduce a key like b'abcabc' to its shortest period b'abc'."""
+    for p in range(1, len(key)):
+        if len(key) % p == 0 and key == key[:p] * (len(key) // p):
+            return key[:p]
+    return key
+
+def xork_solve(ct, keylen=None, top=1, max_keylen=40, freqs=None, method='hamming',
+               keylens_tried=3, sample=1 << 16):
+    """Recover the key of repeating-key XOR ciphertext(s).
+
+    Parameters:
+        ct: A ciphertext, or a list of ciphertexts encrypted with the same key.
+        keylen: The key length, or None to try the best few from xork_keylens().
+        top: The number of keys to return.
+        max_keylen: The largest key length to consider.
+        freqs: The expected plaintext byte distribution: a 256-entry table of
+        frequencies, or a sample plaintext. English text by default.
+        method: The key length ranking method (see xork_keylens()).
+        keylens_tried: The number of ranked key lengths to solve for.
+        sample: The number of bytes used to rank key lengths. Keys are always scored
+        against the whole ciphertext.
+
+    The bytes encrypted by the same key byte form a column. For every column, all 256
+    candidate key bytes are scored at once: with a matrix M[k, c] = log P(c ^ k), the
+    scores are M @ counts, where `counts` is the histogram of the column. The `top`
+    keys with the highest total log-likelihood are then combined exactly from the
+    per-column rankings. Returns a list of (key, score), best first.
+    """
+    import numpy as np
+
+    arrays = _as_arrays(ct)
+    logp = np.array(_as_freqs(freqs))
+    candidates = np.arange(256)
+    M = logp[candidates[:, None] ^ candidates[None, :]]
+    if keylen is None:
+        ranked = xork_keylens(arrays, max_keylen, method, sample)
+        keylens = [k for k, _ in ranked[:keylens_tried]]
+    else:
+        keylens = [keylen]
+
+    results = {}
+    for keylen in keylens:
+        scores = M @ _column_counts(arrays, keylen).T
+        # Combine columns, keeping the `top` best partial keys (exact for sums)
+        beam = [(0.0, b'')]
+        for j in range(keylen):
+            col = scores[:, j]
+            best = np.argsort(col)[::-1][:top]
+            beam = sorted(
+                ((s + col[k], key + bytes([k])) for s, key in beam for k in best),
+                reverse=True,
+            )[:top]
+        for score, key in beam:
+            key = _min_period(key)
+            results[key] = max(results.get(key, score), score)
+    ranked = sorted(results.items(), key=lambda r: r[1], reverse=True)
+    return [(key, float(score)) for key, score in ranked[:top]]
+
+
+class CribResult(NamedTuple):
+    """A keystream hypothesis from CribDragger.drag()."""
+    score: float
+    index: int
+    offset: int
+    keystream: bytes
+
+
+class CribDragger:
+    """Crib dragging against many ciphertexts encrypted with the same keystream.
+
+    Parameters:
+        cts: The ciphertexts, which all start at the same keystream offset.
+        freqs: The expected plaintext byte distribution (see xork_solve()).
+
+    Placing a crib at some offset of ciphertext i fixes the keystream there, which in
+    turn reveals a fragment of every other plaintext. drag() scores all placements at
+    once and returns them ranked; good ones are committed to the keystream with apply()
+    or set_plaintext(), and later drags only return hypotheses consistent with it.
+    """
+
+    def __init__(self, cts, freqs=None):
+        import numpy as np
+
+        self.cts = [c.encode() if isinstance(c, str) else bytes(c) for c in cts]
+        self.lengths = np.array([len(c) for c in self.cts], dtype=np.intp)
+        length = int(self.lengths.max(initial=0))
+        self._ct = np.zeros((len(self.cts), length), dtype=np.uint8)
+        for i, c in enumerate(self.cts):
+            self._ct[i, :len(c)] = np.frombuffer(c, dtype=np.uint8)
+        self._logp = np.array(_as_freqs(freqs), dtype=np.float32)
+        self._pairs = None
+        self.keystream = bytearray(length)
+        self.known = bytearray(length)
+
+    @property
+    def pairs(self):
+        """The (N, N, L) array of pairwise XORs ct_i ^ ct_j, computed once."""
+        if self._pairs is None:
+            self._pairs = self._ct[:, None, :] ^ self._ct[None, :, :]
+        return self._pairs
+
+    def drag(self, crib, top=10, consistent=True, chunk_size=1 << 20):
+        """Slide `crib` across every offset of every ciphertext.
+
+        Parameters:
+            crib: A guessed plaintext fragment.
+            top: The number of hypotheses to return.
+            consistent: Whether to drop hypotheses contradicting the known keystream.
+            chunk_size: The approximate number of scores computed per vectorised step.
+
+        A placement of the crib in ciphertext i at offset o is scored by the mean
+        log-likelihood of the plaintext fragments it reveals in the other ciphertexts,
+        (ct_i ^ ct_j)[o:o+len(crib)] ^ crib. Placements implying the same keystream are
+        reported once. Returns a list of CribResult, best first.
+        """
+        import numpy as np
+
+        crib = crib.encode() if isinstance(crib, str) else bytes(crib)
+        n, length = self._ct.shape
+        m = len(crib)
+        crib_words = np.frombuffer(crib, dtype=np.uint8)
+        if not m or m > length:
+            return []
+        span = length - m + 1
+        # fits[j, o]: whether ciphertext j covers the crib placed at offset o
+        fits = np.arange(span)[None, :] + m <= self.lengths[:, None]
+        tables = self._logp[np.arange(256)[None, :] ^ crib_words[:, None]]
+        pairs = self.pairs
+        scores = np.full((n, span), -np.inf, dtype=np.float32)
+        rows = max(1, chunk_size // max(1, n * span))
+        for start in range(0, n, rows):
+            stop = min(n, start + rows)
+            acc = np.zeros((stop - start, n, span), dtype=np.float32)
+            for t in range(m):
+                acc += tables[t][pairs[start:stop, :, t:t+span]]
+            weight = np.broadcast_to(fits, acc.shape).copy()
+            weight[np.arange(stop - start), np.arange(start, stop)] = False
+            count = weight.sum(axis=1)
+            total = np.where(weight, acc, 0).sum(axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scores[start:stop] = np.where(count > 0, total / (count * m), -np.inf)
+        scores[~fits] = -np.inf
+
+        windows = np.lib.stride_tricks.sliding_window_view(self._ct, m, axis=1)
+        if consistent and any(self.known):
+            known = np.frombuffer(bytes(self.known), dtype=np.bool_)
+            key = np.frombuffer(bytes(self.keystream), dtype=np.uint8)
+            known_w = np.lib.stride_tricks.sliding_window_view(known, m)
+            key_w = np.lib.stride_tricks.sliding_window_view(key, m)
+            derived = windows ^ crib_words
+            conflict = ((derived != key_w) & known_w).any(axis=2)
+            scores[conflict] = -np.inf
+
+        flat = scores.ravel()
+        results = {}
+        for k in np.argsort(flat, kind='stable')[::-1]:
+            if flat[k] == -np.inf or len(results) == top:
+                break
+            i, o = divmod(int(k), span)
+            keystream = bytes(windows[i, o] ^ crib_words)
+            results.setdefault((o, keystream), CribResult(float(flat[k]), i, o, keystream))
+        return list(results.values())
+
+    def apply(self, result):
+        """Commit a hypothesis returned by drag() to the known keystream."""
+        o = result.offset
+        self.keystream[o:o+len(result.keystream)] = result.keystream
+        self.known[o:o+len(result.keystream)] = b'\x01' * len(result.keystream)
+
+    def set_plaintext(self, index, offset, text):
+        """Commit the knowledge that ciphertext `index` decrypts to `text` at `offset`."""
+        text = text.encode() if isinstance(text, str) else bytes(text)
+        ct = self.cts[index][offset:offset+len(text)]
+        if len(ct) != len(text):
+            raise ValueError('text extends past the end of the ciphertext')
+        self.apply(CribResult(0.0, index, offset, bytes(a ^ b for a, b in zip(ct, text))))
+
+    def plaintexts(self, result=None, unknown=b'?'):
+        """Return the plaintexts under the known keystream, or under the known keystream
+        with `result` applied on top. Bytes with an unknown keystream are shown as
+        `unknown`.
+        """
+        keystream, known = self.keystream[:], self.known[:]
+        if result is not None:
+            o = result.offset
+            keystream[o:o+len(result.keystream)] = result.keystream
+            known[o:o+len(result.keystream)] = b'\x01' * len(result.keystream)
+        return [
+            bytes(c ^ k if b else unknown[0] for c, k, b in zip(ct, keystream, known))
+            for ct in self.cts
+        ]
@@ -0,0 +1,14 @@
+import io
+
+
+class ShortReader(io.RawIOBase):
+    """A file that returns at most 7 bytes per read."""
+
+    def __init__(self, data):
+        self.f = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self.f.readinto(memoryview(b)[:7])
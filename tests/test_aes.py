@@ -1,5 +1,13 @@
+import asyncio
+import io
+import json
+import mmap
+import os
 import pytest
+from Crypto.Cipher import AES
 from crypy.aes import *
+from crypy.util import pad, unpad
+from tests import ShortReader
 
 
 ecb_test_vectors = [
@@ -57,3 +65,215 @@ def test_cbc(key_hex, iv_hex, pt_hex, ct_hex):
     key, iv, pt, ct = map(bytes.fromhex, [key_hex, iv_hex, pt_hex, ct_hex])
     assert cbcenc(pt, key, iv) == ct
     assert cbcdec(ct, key, iv) == pt
+
+def make_padding_oracle(key):
+    def oracle(data):
+        try:
+            unpad(cbcdec(data[16:], key, data[:16]), 16)
+            return True
+        except ValueError:
+            return False
+    return oracle
+
+@pytest.mark.parametrize('batch_size,workers,batched', [
+    (256, 1, False),
+    (32, 1, False),
+    (256, 4, False),
+    (256, 1, True),
+])
+def test_padding_oracle(batch_size, workers, batched):
+    key, iv = os.urandom(16), os.urandom(16)
+    pt = pad(b'attack at dawn, retreat at dusk' + os.urandom(20), 16)
+    ct = cbcenc(pt, key, iv)
+    oracle = make_padding_oracle(key)
+    if batched:
+        single = oracle
+        oracle = lambda queries: [single(q) for q in queries]
+    result = padding_oracle(ct, oracle, iv, batch_size=batch_size, workers=workers,
+                            batched=batched)
+    assert result.plaintext == pt
+    assert result.queries >= len(pt)
+    assert result.qps > 0
+    assert padding_oracle(iv + ct, oracle, batch_size=batch_size, workers=workers,
+                          batched=batched).plaintext == pt
+
+def test_padding_oracle_false_positive():
+    # Byte 14 of the block decrypts to \x02 under the all-zero forged IV, so \x02\x02
+    # is also valid padding while searching for the last byte
+    key, iv = os.urandom(16), os.urandom(16)
+    ct = cbcenc(os.urandom(14) + b'\x02\x02', key, bytes(16))
+    result = padding_oracle(ct, make_padding_oracle(key), iv)
+    assert result.plaintext == cbcdec(ct, key, iv)
+
+def test_padding_oracle_async():
+    key, iv = os.urandom(16), os.urandom(16)
+    pt = pad(b'the eagle has landed', 16)
+    ct = cbcenc(pt, key, iv)
+    check = make_padding_oracle(key)
+
+    async def handle(reader, writer):
+        while data := await reader.readexactly(32):
+            writer.write(b'1' if check(data) else b'0')
+            await writer.drain()
+
+    async def main():
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        connections = [await asyncio.open_connection('127.0.0.1', port) for _ in range(4)]
+        idle = asyncio.Queue()
+        for conn in connections:
+            idle.put_nowait(conn)
+
+        async def oracle(data):
+            reader, writer = await idle.get()
+            writer.write(data)
+            answer = await reader.readexactly(1)
+            idle.put_nowait((reader, writer))
+            return answer == b'1'
+
+        result = await padding_oracle_async(ct, oracle, iv)
+        for _, writer in connections:
+            writer.close()
+        server.close()
+        return result
+
+    assert asyncio.run(main()).plaintext == pt
+
+    async def oracle(data):
+        return check(data)
+    assert padding_oracle(ct, oracle, iv).plaintext == pt
+
+@pytest.mark.parametrize('blocks', [0, 1, 2, 3, 63, 64, 65])
+def test_cbc_sizes(blocks):
+    key, iv, pt = os.urandom(16), os.urandom(16), os.urandom(16 * blocks)
+    ct = AES.new(key, AES.MODE_CBC, iv).encrypt(pt)
+    assert cbcenc(pt, key, iv) == ct
+    assert cbcdec(ct, key, iv) == pt
+    assert cbcenc(bytearray(pt), bytearray(key), bytearray(iv)) == ct
+    assert cbcdec(memoryview(ct), key, memoryview(iv)) == pt
+    with pytest.raises(ValueError):
+        cbcenc(pt + b'x', key, iv)
+    with pytest.raises(ValueError):
+        cbcdec(ct, key, iv[:15])
+
+def test_ecb_many():
+    key = os.urandom(24)
+    pts = [os.urandom(16 * n) for n in (1, 0, 3, 1)]
+    cts = ecbenc_many(pts, key)
+    assert cts == [ecbenc(pt, key) for pt in pts]
+    assert ecbdec_many(cts, key) == pts
+    assert ecbenc_many([], key) == []
+    with pytest.raises(ValueError):
+        ecbenc(b'\x00' * 16, b'short key')
+
+@pytest.mark.parametrize('prefix,secret_len', [
+    (b'', 0),
+    (b'', 37),
+    (b'abcde', 16),
+    (b'y' * 16, 1),
+    # Repeated blocks inside the prefix must not be mistaken for our input
+    (b'x' * 32 + b'abcde', 50),
+])
+def test_ecb_byte_at_a_time(prefix, secret_len):
+    key = os.urandom(16)
+    prefix_len = len(prefix)
+    secret = os.urandom(secret_len)
+    queries = []
+
+    def oracle(data):
+        queries.append(data)
+        return ecbenc(pad(prefix + data + secret, 16), key)
+
+    assert ecb_byte_at_a_time(oracle) == secret
+    assert len(queries) <= secret_len + 3 * 16 + 1
+    queries.clear()
+    assert ecb_byte_at_a_time(oracle, prefix_len) == secret
+    assert len(queries) <= secret_len + 16 + 1
+
+def test_aes_key_search():
+    key, pt = os.urandom(24), os.urandom(16)
+    ct = ecbenc(pt, key)
+    template = bytearray(key)
+    template[0] = template[23] = 0
+    assert aes_key_search(template, [0, 23], pt, ct, processes=1) == key
+    assert aes_key_search(template, [0, 23], pt, ct, processes=2, chunk_size=4096) == key
+
+    mask = bytes.fromhex('00' * 10 + '8001' + '00' * 10 + '0f07')
+    template = bytes(k & ~m for k, m in zip(key, mask))
+    assert aes_key_search(template, mask, pt + b'more', ct, processes=1) == key
+    assert aes_key_search(template, mask, pt, os.urandom(16), processes=1) is None
+    with pytest.raises(ValueError):
+        aes_key_search(template[:20], [0], pt, ct)
+
+def test_aes_key_search_checkpoint(tmp_path):
+    key, pt = os.urandom(16), os.urandom(16)
+    ct = ecbenc(pt, key)
+    mask = bytes(14) + b'\x3f\xff'
+    template = bytes(k & ~m for k, m in zip(key, mask))
+    path = tmp_path / 'search.json'
+    seen = []
+
+    def interrupt(done, total, keyrate):
+        seen.append(done)
+        if len(seen) == 3:
+            raise KeyboardInterrupt
+
+    # Search the keys below the answer first, so that the search gets interrupted
+    target = int.from_bytes(key[14:], 'big') & 0x3fff
+    chunk_size = max(1, target // 4)
+    if target >= 3 * chunk_size:
+        with pytest.raises(KeyboardInterrupt):
+            aes_key_search(template, mask, pt, ct, processes=1, chunk_size=chunk_size,
+                           checkpoint=path, checkpoint_interval=0, progress=interrupt)
+        assert json.loads(path.read_text())['done'] == 3 * chunk_size
+    assert aes_key_search(template, mask, pt, ct, processes=1, chunk_size=chunk_size,
+                          checkpoint=path) == key
+    assert json.loads(path.read_text())['key'] == key.hex()
+    # Finished searches are answered from the checkpoint
+    assert aes_key_search(template, mask, pt, ct, chunk_size=chunk_size,
+                          checkpoint=path) == key
+    with pytest.raises(ValueError):
+        aes_key_search(template, mask, pt, ct, chunk_size=chunk_size + 1, checkpoint=path)
+
+def test_aes_output():
+    key, iv, pt = os.urandom(16), os.urandom(16), os.urandom(64)
+    out = bytearray(64)
+    assert ecbenc(pt, key, output=out) is None
+    assert out == ecbenc(pt, key)
+    ecbdec(bytes(out), key, output=memoryview(out))
+    assert out == pt
+    cbcenc(pt[:16], key, iv, output=memoryview(out)[:16])
+    assert out[:16] == cbcenc(pt[:16], key, iv)
+    cbcdec(cbcenc(pt, key, iv), key, iv, output=out)
+    assert out == pt
+
+@pytest.mark.parametrize('chunk_size', [16, 100, 1 << 20])
+def test_aes_stream(tmp_path, chunk_size):
+    key, iv, pt = os.urandom(16), os.urandom(16), os.urandom(16 * 97)
+    ecb_ct, cbc_ct = ecbenc(pt, key), cbcenc(pt, key, iv)
+
+    out = io.BytesIO()
+    assert ecbenc_stream(io.BytesIO(pt), out, key, chunk_size) == len(pt)
+    assert out.getvalue() == ecb_ct
+    out = io.BytesIO()
+    assert cbcenc_stream(ShortReader(pt), out, key, iv, chunk_size) == len(pt)
+    assert out.getvalue() == cbc_ct
+
+    path = tmp_path / 'ct'
+    path.write_bytes(cbc_ct)
+    with open(path, 'r+b') as f, mmap.mmap(f.fileno(), 0) as m:
+        out = bytearray(len(pt))
+        cbcdec_stream(m, out, key, iv, chunk_size)
+        assert out == pt
+        # In place
+        cbcdec_stream(m, m, key, iv, chunk_size)
+        assert m[:] == pt
+    cbcenc_stream(path, tmp_path / 'ct2', key, iv, chunk_size)
+    assert (tmp_path / 'ct2').read_bytes() == cbc_ct
+    ecbdec_stream(ecb_ct, tmp_path / 'pt', key, chunk_size)
+    assert (tmp_path / 'pt').read_bytes() == pt
+
+    with pytest.raises(ValueError):
+        ecbenc_stream(pt + b'x', bytearray(len(pt) + 1), key, chunk_size)
+    with pytest.raises(ValueError):
+        ecbenc_stream(ShortReader(pt + b'x'), io.BytesIO(), key, chunk_size)
@@ -0,0 +1,104 @@
+import os
+import random
+import pytest
+from Crypto.Cipher import AES
+from crypy.gcm import *
+
+
+def test_gf128_mul():
+    one = 1 << 127
+    rng = random.Random(0)
+    for _ in range(50):
+        x, y, z = (rng.getrandbits(128) for _ in range(3))
+        assert gf128_mul(x, one) == x
+        assert gf128_mul(x, y) == gf128_mul(y, x)
+        assert gf128_mul(x, y ^ z) == gf128_mul(x, y) ^ gf128_mul(x, z)
+        assert gf128_mul(gf128_mul(x, y), z) == gf128_mul(x, gf128_mul(y, z))
+        assert GHash(y).mul(x) == gf128_mul(x, y)
+    # x^127 * x = x^128 = x^7 + x^2 + x + 1
+    assert gf128_mul(1, 1 << 126) == 0xe1 << 120
+
+@pytest.mark.parametrize('h_hex,aad_hex,ct_hex,ghash_hex', [
+    # Test cases 1-2 of the GCM spec
+    ('66e94bd4ef8a2c3b884cfa59ca342b2e', '', '', '00000000000000000000000000000000'),
+    ('66e94bd4ef8a2c3b884cfa59ca342b2e', '', '0388dace60b6a392f328c2b971b2fe78',
+     'f38cbb1ad69223dcc3457ae5b6b0f885'),
+])
+def test_ghash_vectors(h_hex, aad_hex, ct_hex, ghash_hex):
+    h, aad, ct = map(bytes.fromhex, [h_hex, aad_hex, ct_hex])
+    assert ghash(h, aad, ct).hex() == ghash_hex
+    assert GHash(int(h_hex, 16)).digest(aad, ct).hex() == ghash_hex
+
+@pytest.mark.parametrize('aad_len,pt_len', [(0, 1), (13, 0), (20, 64), (16, 1000)])
+def test_ghash_tag(aad_len, pt_len):
+    key, nonce = os.urandom(16), os.urandom(12)
+    aad, pt = os.urandom(aad_len), os.urandom(pt_len)
+    cipher = AES.new(key, AES.MODE_GCM, nonce)
+    cipher.update(aad)
+    ct, tag = cipher.encrypt_and_digest(pt)
+    ecb = AES.new(key, AES.MODE_ECB)
+    h = ecb.encrypt(bytes(16))
+    mask = ecb.encrypt(nonce + b'\x00\x00\x00\x01')
+    assert bytes(a ^ b for a, b in zip(ghash(h, aad, ct), mask)) == tag
+
+def gcm_messages(key, nonce, lengths):
+    messages = []
+    for aad_len, pt_len in lengths:
+        aad, pt = os.urandom(aad_len), os.urandom(pt_len)
+        cipher = AES.new(key, AES.MODE_GCM, nonce)
+        cipher.update(aad)
+        messages.append((aad, *cipher.encrypt_and_digest(pt)))
+    return messages
+
+@pytest.mark.parametrize('lengths', [
+    [(0, 16), (0, 32)],
+    [(5, 40), (0, 17), (12, 100)],
+    [(16, 16 * 2000), (0, 16 * 2000 + 3), (7, 16 * 1999)],
+])
+def test_gcm_nonce_reuse(lengths):
+    pytest.importorskip('sage.all')
+    key, nonce = os.urandom(16), os.urandom(12)
+    messages = gcm_messages(key, nonce, lengths)
+    h = AES.new(key, AES.MODE_ECB).encrypt(bytes(16))
+    mask = AES.new(key, AES.MODE_ECB).encrypt(nonce + b'\x00\x00\x00\x01')
+    candidates = gcm_nonce_reuse(messages)
+    assert (h, mask) in candidates
+    if len(messages) > 2:
+        assert candidates == [(h, mask)]
+    # Forge a tag for a new message
+    aad, ct = b'admin=1', os.urandom(23)
+    cipher = AES.new(key, AES.MODE_GCM, nonce)
+    cipher.update(aad)
+    cipher.decrypt_and_verify(ct, bytes(a ^ b for a, b in zip(ghash(h, aad, ct), mask)))
+
+def test_gcm_nonce_reuse_errors():
+    with pytest.raises(ValueError):
+        gcm_nonce_reuse([(b'', b'', bytes(16))])
+
+def test_gcm_unpack_ints():
+    data = os.urandom(50)
+    blocks = gcm_unpack(data, field=False)
+    assert blocks == [int.from_bytes(data[i:i+16].ljust(16, b'\x00'), 'big')
+                      for i in range(0, 50, 16)]
+    assert gcm_pack(blocks) == data + bytes(14)
+    assert gcm_unpack(b'', field=False) == []
+    assert gcm_pack([]) == b''
+
+def test_gcm_unpack_field():
+    pytest.importorskip('sage.all')
+    F = gfield()
+    x = F.gen()
+    # The first bit of a block is the constant term, and the last one is x^127
+    assert b2gcm(b'\x80' + bytes(15)) == F(1)
+    assert b2gcm(bytes(15) + b'\x01') == x**127
+    data = os.urandom(16 * 300 + 5)
+    blocks = gcm_unpack(data)
+    padded = data + bytes(11)
+    assert blocks == [b2gcm(padded[i:i+16]) for i in range(0, len(padded), 16)]
+    assert gcm_pack(blocks) == data + bytes(11)
+    assert [gcm2b(g) for g in blocks] == [gcm_pack([g]) for g in blocks]
+    ns = gcm_unpack(data, field=False)
+    assert i2gcm_many(ns) == blocks == [i2gcm(n) for n in ns]
+    assert gcm2i_many(blocks) == ns == [gcm2i(g) for g in blocks]
+    # Field multiplication agrees with the Sage-free one
+    assert gcm2i(blocks[0] * blocks[1]) == gf128_mul(ns[0], ns[1])
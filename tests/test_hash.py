@@ -1,5 +1,9 @@
+from functools import partial
 from random import randrange
+import mmap
 import os
+import subprocess
+import sys
 import pytest
 from crypy.hash import *
 
@@ -48,3 +52,262 @@ def test_extend(hasher, hashfunc):
         h = hashfunc(data)
         new_h, append = hasher.extend(h, len(data), suffix)
         assert hashfunc(data + append) == new_h
+
+@pytest.mark.parametrize('hasher,hashfunc', [
+    (MD4, md4),
+    (MD5, md5),
+    (SHA1, sha1),
+    (SHA224, sha224),
+    (SHA256, sha256),
+    (SHA384, sha384),
+    (SHA512, sha512),
+])
+def test_hash_many(hasher, hashfunc):
+    pytest.importorskip('numpy')
+    msgs = [os.urandom(n) for n in range(hasher.block_size * 2 + 2)]
+    assert hasher.hash_many(msgs) == [hashfunc(m) for m in msgs]
+
+    blocks = [os.urandom(hasher.block_size) for _ in range(8)]
+    states = [hasher.compress(b, hasher.init_state) for b in blocks]
+    assert hasher.compress_many(blocks, None).tolist() == list(map(list, states))
+
+@pytest.mark.parametrize('native', [True, False])
+@pytest.mark.parametrize('hasher', [MD5, SHA1, SHA224, SHA384])
+def test_compress_blocks_states(hasher, native, monkeypatch):
+    if not native:
+        monkeypatch.setattr(hasher, '_native', None)
+    data = os.urandom(hasher.block_size * 2)
+    states = [hasher.compress(os.urandom(hasher.block_size), hasher.init_state)
+              for _ in range(5)]
+    expected = [hasher.compress_blocks(data, state) for state in states]
+    assert list(hasher.compress_blocks_states(data, states)) == expected
+
+@pytest.mark.parametrize('hasher,hashfunc', [
+    (MD4, md4),
+    (MD5, md5),
+    (SHA1, sha1),
+    (SHA224, sha224),
+    (SHA256, sha256),
+    (SHA384, sha384),
+    (SHA512, sha512),
+])
+def test_streaming(hasher, hashfunc):
+    data = os.urandom(hasher.block_size * 5 + 3)
+    h = hasher.new()
+    i = 0
+    while i < len(data):
+        n = randrange(hasher.block_size * 2)
+        h.update(memoryview(data)[i:i+n])
+        i += n
+    assert h.digest() == hashfunc(data)
+
+    prefix = hasher.new(data[:100])
+    for suffix in [b'', b'a', os.urandom(200)]:
+        assert prefix.copy().update(suffix).digest() == hashfunc(data[:100] + suffix)
+    assert prefix.digest() == hashfunc(data[:100])
+
+    state, count = prefix.midstate()
+    assert count == 100 - 100 % hasher.block_size
+    resumed = hasher.from_state(state, count).update(data[count:])
+    assert resumed.digest() == hashfunc(data)
+    with pytest.raises(ValueError):
+        hasher.from_state(state, count + 1)
+
+@pytest.mark.parametrize('hasher,hashfunc', [
+    (MD5, md5),
+    (SHA1, sha1),
+    (SHA256, sha256),
+    (SHA512, sha512),
+])
+def test_extend_range(hasher, hashfunc):
+    data = os.urandom(randrange(hasher.block_size * 3))
+    suffix = os.urandom(randrange(hasher.block_size * 3))
+    h = hashfunc(data)
+    msglens = range(hasher.block_size * 3)
+    results = list(hasher.extend_range(h, msglens, suffix))
+    assert [r[0] for r in results] == list(msglens)
+    for msglen, new_h, append in results:
+        assert (new_h, append) == hasher.extend(h, msglen, suffix)
+    _, new_h, append = results[len(data)]
+    assert hashfunc(data + append) == new_h
+
+@pytest.mark.parametrize('hasher', [MD4, MD5, SHA1, SHA224, SHA256, SHA384, SHA512])
+def test_backend(hasher):
+    assert hasher.backend() in ('openssl', 'python')
+    data = os.urandom(hasher.block_size * 3)
+    state = tuple(randrange(2**hasher.word_size) for _ in hasher.init_state)
+    expected = state
+    for i in range(0, len(data), hasher.block_size):
+        expected = hasher.compress(data[i:i+hasher.block_size], expected)
+    assert hasher.compress_blocks(data, state) == hasher.finalize(expected)
+
+def test_backend_fallback():
+    code = (
+        'from crypy.hash import SHA256, sha256;'
+        'assert SHA256.backend() == "python";'
+        'assert SHA256.hash(b"abc") == sha256(b"abc")'
+    )
+    env = dict(os.environ, CRYPY_LIBCRYPTO='')
+    subprocess.run([sys.executable, '-c', code], env=env, check=True)
+
+class ToyHash(HashAlgorithm):
+    """A hash that only implements compress(), as subclasses could in the baseline."""
+    pack_fmt = '>2I'
+    init_state = (1, 2)
+
+    @classmethod
+    def compress(cls, data, state):
+        a, b = state
+        for x in bytes(data):
+            a, b = b, (a * 31 + x) & 0xffffffff
+        return (a, b)
+
+def test_custom_compress():
+    data = b'abc' * 50
+    padded = ToyHash.pad(data)
+    state = ToyHash.init_state
+    for i in range(0, len(padded), ToyHash.block_size):
+        state = ToyHash.compress(padded[i:i+ToyHash.block_size], state)
+    assert ToyHash.backend() == 'python'
+    assert ToyHash.hash(data) == ToyHash.finalize(state)
+    assert ToyHash.new(data[:7]).update(data[7:]).digest() == ToyHash.finalize(state)
+
+@pytest.mark.parametrize('hashfunc,expected', [
+    ('md5', md5),
+    (md4, md4),
+    (sha256, sha256),
+    (SHA1, sha1),
+    (SHA512.new, sha512),
+])
+def test_prefix_cache(hashfunc, expected):
+    cache = PrefixCache(hashfunc, maxsize=2)
+    prefixes = [os.urandom(n) for n in (0, 50, 200)]
+    for prefix in prefixes:
+        for suffix in [b'', b'x', os.urandom(300)]:
+            assert cache.hash(prefix, suffix) == expected(prefix + suffix)
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (6, 3)
+    cache.hash(prefixes[0])
+    assert cache.misses == 4
+
+def _ends_with_42(h):
+    # Module level, so it can be pickled for workers started with spawn/forkserver
+    return h[-1] == 0x42
+
+@pytest.mark.parametrize('hashfunc,expected,processes', [
+    ('md5', md5, 1),
+    (sha1, sha1, 2),
+    ('sha256', sha256, 2),
+    (sha512, sha512, 1),
+])
+def test_pow_search(hashfunc, expected, processes):
+    prefix = os.urandom(20)
+    result = pow_search(hashfunc, prefix, 12, processes=processes)
+    assert result.digest == expected(prefix + result.candidate)
+    assert int.from_bytes(result.digest, 'big') >> (8 * len(result.digest) - 12) == 0
+    assert result.hashes > 0 and result.hashrate > 0
+
+    result = pow_search(hashfunc, prefix, _ends_with_42, b'01', suffix=b'!')
+    assert result.digest == expected(prefix + result.candidate + b'!')
+    assert result.digest[-1] == 0x42
+    assert set(result.candidate) <= set(b'01')
+
+def _check_extension(hashfunc, data, new_h, append):
+    return hashfunc(data + append) == new_h
+
+@pytest.mark.parametrize('hasher,hashfunc,processes', [
+    (SHA224, sha224, 1),
+    (SHA224, sha224, 2),
+    (SHA384, sha384, 1),
+])
+def test_extend_truncated(hasher, hashfunc, processes):
+    data = os.urandom(randrange(100))
+    suffix = os.urandom(randrange(1, 100))
+    h = hashfunc(data)
+    padding = hasher.make_padding(len(data))
+    # Narrow the search down to a window around the missing state word(s)
+    state = hasher.from_state(hasher.init_state, 0).update(data + padding).midstate()[0]
+    missing = hasher.unfinalize(h).count(None)
+    value = int.from_bytes(b''.join(
+        w.to_bytes(hasher.word_size // 8, 'big') for w in state[-missing:]
+    ), 'big')
+    lo = value - value % 1000
+    candidates = range(lo, lo + 1000)
+
+    suffix2 = os.urandom(randrange(100))
+    known = (suffix2, hashfunc(data + padding + suffix2))
+    reports = []
+    progress = lambda done, total, rate: reports.append((done, total))
+    new_h, append = extend_truncated(
+        hasher, h, len(data), suffix, known=known, candidates=candidates,
+        processes=processes, chunk_size=300, progress=progress,
+    )
+    assert hashfunc(data + append) == new_h
+    assert reports[-1][0] <= reports[-1][1] == 1000
+
+    # A partial of a module-level function, so it can be pickled for the workers
+    check = partial(_check_extension, hashfunc, data)
+    new_h, append = extend_truncated(
+        hasher, h, len(data), suffix, check=check, candidates=candidates,
+        processes=processes,
+    )
+    assert hashfunc(data + append) == new_h
+    assert extend_truncated(
+        hasher, h, len(data), suffix, known=known, candidates=range(lo - 10, lo),
+        processes=processes,
+    ) is None
+    # Ranges with more than sys.maxsize values are fine
+    reports.clear()
+    assert extend_truncated(
+        hasher, h, len(data), suffix, known=known, candidates=range(lo, lo + (1 << 100)),
+        processes=1, progress=progress,
+    ) is not None
+    assert reports[-1][1] == 1 << 100
+    with pytest.raises(ValueError):
+        extend_truncated(hasher, h, len(data), suffix, known=known, candidates=[lo])
+
+@pytest.mark.parametrize('native', [True, False])
+@pytest.mark.parametrize('hasher,hashfunc', [
+    (MD5, md5),
+    (SHA1, sha1),
+    (SHA256, sha256),
+    (SHA512, sha512),
+])
+def test_hash_file(hasher, hashfunc, native, monkeypatch, tmp_path):
+    if not native:
+        monkeypatch.setattr(hasher, '_native', None)
+    data = os.urandom(10000)
+    path = tmp_path / 'data.bin'
+    path.write_bytes(data)
+    assert hasher.hash_file(path) == hashfunc(data)
+    assert hasher.hash_file(str(path), chunk_size=300) == hashfunc(data)
+    # Chunks smaller than a block are rounded up to one block
+    assert hasher.hash_file(path, chunk_size=100) == hashfunc(data)
+    assert hasher.hash_file(path, chunk_size=0) == hashfunc(data)
+    with open(path, 'rb') as f:
+        assert hasher.hash_file(f, chunk_size=1000) == hashfunc(data)
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        assert hasher.hash(m) == hashfunc(data)
+    assert hasher.new(b'ab').update_file(path).digest() == hashfunc(b'ab' + data)
+
+@pytest.mark.parametrize('hashfunc,expected,processes', [
+    ('md5', md5, 1),
+    (sha1, sha1, 2),
+    (sha256, sha256, 2),
+])
+def test_collide(hashfunc, expected, processes):
+    bits = 24
+    result = collide(hashfunc, bits, count=2, processes=processes, seed=1)
+    assert len(result.pairs) == 2
+    for m1, m2 in result.pairs:
+        assert m1 != m2
+        h1, h2 = expected(m1), expected(m2)
+        assert int.from_bytes(h1[:3], 'big') == int.from_bytes(h2[:3], 'big')
+    assert result.hashes > 0 and result.hashrate > 0
+
+    encode = lambda x: b'user-%d' % x
+    result = collide(hashfunc, 20, encode=encode, distinguished_bits=4, processes=1)
+    (m1, m2), = result.pairs
+    assert m1.startswith(b'user-') and m2.startswith(b'user-')
+    assert expected(m1)[:2] == expected(m2)[:2]
+    assert expected(m1)[2] >> 4 == expected(m2)[2] >> 4
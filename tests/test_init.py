@@ -0,0 +1,58 @@
+import importlib
+import subprocess
+import sys
+import pytest
+import crypy
+
+
+def run(code):
+    return subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True, check=True
+    ).stdout.splitlines()
+
+@pytest.mark.parametrize('module', sorted(crypy._exports))
+def test_exports(module):
+    assert crypy._exports[module] == importlib.import_module(f'crypy.{module}').__all__
+
+def test_lazy_attributes():
+    from crypy.util import xor
+    assert crypy.xor is xor
+    assert 'xor' in dir(crypy)
+    assert crypy.hash is importlib.import_module('crypy.hash')
+    with pytest.raises(AttributeError):
+        crypy.does_not_exist
+
+def test_star_import():
+    namespace = {}
+    exec('from crypy import *', namespace)
+    assert set(crypy.__all__) <= set(namespace)
+    assert namespace['sha256'] is crypy.hash.sha256
+    assert namespace['ecbenc'] is crypy.aes.ecbenc
+
+def test_import_is_lazy():
+    out = run(
+        'import sys, crypy\n'
+        'before = set(sys.modules)\n'
+        'crypy.xor\n'
+        'print(" ".join(sorted(before)))\n'
+        'print(" ".join(sorted(sys.modules)))\n'
+    )
+    before, after = set(out[0].split()), set(out[1].split())
+    heavy = {'Crypto.Cipher.AES', 'gmpy2', 'crypy.aes', 'crypy.hash', 'crypy.lattice'}
+    assert not {m for m in before if m.startswith('crypy.')}
+    assert not heavy & after
+    assert 'crypy.util' in after
+
+def test_import_time():
+    # Importing the package must stay a small fraction of importing everything
+    lazy, eager = map(float, run(
+        'import time\n'
+        't0 = time.perf_counter()\n'
+        'import crypy\n'
+        't1 = time.perf_counter()\n'
+        'from crypy import *\n'
+        't2 = time.perf_counter()\n'
+        'print(t1 - t0)\n'
+        'print(t2 - t0)\n'
+    ))
+    assert lazy * 5 < eager
@@ -1,5 +1,8 @@
+import mmap
+import random
 import pytest
 from crypy.util import *
+from tests import ShortReader
 
 
 def test_b2i():
@@ -267,3 +270,146 @@ def test_xor(args, expected):
 ])
 def test_xork(args, expected):
     assert xork(*args) == expected
+
+def test_xor_into():
+    buf = bytearray(b'xyzzy')
+    assert xor_into(buf, buf, b'a') is buf
+    assert buf == xork(b'xyzzy', b'a')
+    out = bytearray(6)
+    xor_into(memoryview(out), 'abc', b'xyzabc', b'y')
+    assert out == b'`b`yyy'
+    assert xor(memoryview(b'xxx'), bytearray(b'xyzz')) == b'\x00\x01\x02'
+    with pytest.raises(ValueError):
+        xork(b'', b'a')
+    # `out` may appear after the first input, and iterables of ints are accepted
+    buf = bytearray(b'xyzzy')
+    xor_into(buf, b'ab', buf, [1, 2, 3])
+    assert buf == xork(b'ab', b'xyzzy', [1, 2, 3])
+    with pytest.raises(ValueError):
+        xor_into(bytearray(3), b'a', b'')
+    assert xor([1, 2, 3], [4, 5, 6]) == b'\x05\x07\x05'
+    assert xork(range(3), b'a') == b'a`c'
+
+@pytest.mark.parametrize('mode', ['list', 'array', 'numpy'])
+@pytest.mark.parametrize('s,word_size,endian,signed,expected', [
+    (b'\x01\x02\x03', 8, 'little', False, [1, 2, 3]),
+    (b'\xff\xfe\xfd', 8, 'little', True, [-1, -2, -3]),
+    (b'\x00\x01\x00\x02', 16, 'big', False, [1, 2]),
+    (b'\xff\xff\x00\x01', 16, 'little', True, [-1, 256]),
+    (b'\x01\x02\x03\x04\x05', 16, 'little', False, [0x0201, 0x0403, 0x05]),
+    (b'\x12\x34\x56\x78\x9a', 32, 'big', False, [0x12345678, 0x9a000000]),
+    (b'\xff' * 8 + b'\x01', 64, 'little', True, [-1, 1]),
+])
+def test_unpacks_mode(s, word_size, endian, signed, expected, mode):
+    if mode == 'numpy':
+        pytest.importorskip('numpy')
+    words = unpacks(s, word_size, endian, signed=signed, mode=mode)
+    assert list(map(int, words)) == expected
+
+def test_unpacks_numpy_view():
+    np = pytest.importorskip('numpy')
+    buf = bytearray(b'\x00\x01\x00\x02')
+    words = u16s(buf, 'big', mode='numpy')
+    assert words.dtype == np.dtype('>u2')
+    buf[1] = 3
+    assert words.tolist() == [3, 2]
+    with pytest.raises(ValueError):
+        unpacks(b'\x00' * 3, 24, mode='array')
+
+@pytest.mark.parametrize('word_size', [8, 16, 24, 32, 64])
+def test_iter_unpacks(word_size, tmp_path):
+    data = bytes(range(256)) * 3 + b'\x01\x02\x03'
+    expected = unpacks(data, word_size, 'big')
+    assert list(iter_unpacks(data, word_size, 'big')) == expected
+    path = tmp_path / 'data.bin'
+    path.write_bytes(data)
+    with open(path, 'rb') as f:
+        assert list(iter_unpacks(f, word_size, 'big', chunk_size=100)) == expected
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        assert list(iter_unpacks(m, word_size, 'big')) == expected
+        assert list(iter_unpacks(m, word_size, 'big', chunk_size=100)) == expected
+    assert list(iter_unpacks(data, word_size, 'big', chunk_size=1)) == expected
+    # File objects may return short reads
+    assert list(iter_unpacks(ShortReader(data), word_size, 'big')) == expected
+
+def test_brev_exact():
+    for word_size in range(1, 140):
+        for _ in range(10):
+            x = random.getrandbits(word_size + 4)
+            expected = int(f'{x & ((1 << word_size) - 1):0{word_size}b}'[::-1], 2)
+            assert brev(x, word_size) == expected
+
+def test_brev_bytes():
+    data = random.randbytes(64)
+    rev = brev_bytes(data)
+    assert [brev(b, 8) for b in data] == list(rev)
+    for i in range(0, len(data), 16):
+        x = int.from_bytes(data[i:i+16], 'big')
+        assert int.from_bytes(rev[i:i+16], 'little') == brev(x, 128)
+    assert brev_bytes(memoryview(rev)) == data
+
+@pytest.mark.parametrize('word_size', [5, 8, 16, 31, 32, 64, 128])
+def test_brev_many(word_size):
+    xs = [random.getrandbits(word_size) for _ in range(100)]
+    expected = [brev(x, word_size) for x in xs]
+    assert brev_many(xs, word_size) == expected
+    if word_size > 64:
+        return
+    np = pytest.importorskip('numpy')
+    for dtype in [np.uint8, np.uint16, np.uint32, np.uint64]:
+        if np.dtype(dtype).itemsize * 8 < word_size:
+            continue
+        arr = np.array(xs, dtype=dtype)
+        out = brev_many(arr, word_size)
+        assert out.dtype == arr.dtype and out.tolist() == expected
+    with pytest.raises(ValueError):
+        brev_many(np.array(xs, dtype=np.uint64), 65)
+
+@pytest.mark.parametrize('word_size', [8, 12, 16, 32, 64])
+def test_bit_primitives_arrays(word_size):
+    np = pytest.importorskip('numpy')
+    xs = [random.getrandbits(word_size) for _ in range(50)] + [0, (1 << word_size) - 1]
+    arr = np.array(xs, dtype=np.uint64)
+    signed = np.array([ci(x, word_size) for x in xs], dtype=np.int64)
+    for n in [0, 1, 7, word_size - 1, word_size, -3]:
+        assert rol(arr, n, word_size).tolist() == [rol(x, n, word_size) for x in xs]
+        assert ror(arr, n, word_size).tolist() == [ror(x, n, word_size) for x in xs]
+    ns = np.arange(len(xs)) % word_size
+    assert rol(arr, ns, word_size).tolist() == [
+        rol(x, int(n), word_size) for x, n in zip(xs, ns)
+    ]
+    for ns in [ns.astype(np.uint64), np.ones(len(xs), dtype=np.uint64)]:
+        assert ror(arr, ns, word_size).tolist() == [
+            ror(x, int(n), word_size) for x, n in zip(xs, ns)
+        ]
+    assert cu(signed, word_size).tolist() == xs
+    assert ci(arr, word_size).tolist() == signed.tolist()
+
+def test_bit_primitives_array_dtypes():
+    np = pytest.importorskip('numpy')
+    x = np.array([0x80000001, -1], dtype=np.int64)
+    assert cu32(x).dtype == np.uint32
+    assert cu32(x).tolist() == [0x80000001, 0xffffffff]
+    assert ci32(x).tolist() == [-0x7fffffff, -1]
+    assert rol32(x, 1).tolist() == [3, 0xffffffff]
+    assert ror64(np.array([1], dtype=np.uint64), 1).tolist() == [1 << 63]
+    assert (cu8(np.array([250], dtype=np.uint8)) + 10).tolist() == [4]
+
+def test_words():
+    pytest.importorskip('numpy')
+    s = Words([1, 2, 0x80000000], 32)
+    assert (s.rol(1) + 0xffffffff).tolist() == [1, 3, 0]
+    assert s.ror(1) == Words([0x80000000, 1, 0x40000000], 32)
+    t = Words([-1, 5, 7], 32)
+    assert t.tolist() == [0xffffffff, 5, 7]
+    assert (s + t).tolist() == [0, 7, 0x80000007]
+    assert (s - t).tolist() == [2, 0xfffffffd, 0x7ffffff9]
+    assert (1 - s).tolist() == [0, 0xffffffff, 0x80000001]
+    assert (s ^ t & 0xff).tolist() == [0xfe, 7, 0x80000007]
+    assert (~s)[0] == 0xfffffffe
+    assert (s << 1).tolist() == [2, 4, 0]
+    s[0] = -2
+    assert s[0] == 0xfffffffe and len(s[1:]) == 2
+    assert list(Words(range(4), 8).rol(Words([0, 1, 2, 3], 8).array)) == [0, 2, 8, 24]
+    with pytest.raises(ValueError):
+        Words([1], 12)
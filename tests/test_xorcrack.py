@@ -0,0 +1,82 @@
+import random
+import pytest
+from crypy.util import xork
+from crypy.xorcrack import *
+
+np = pytest.importorskip('numpy')
+
+TEXT = (
+    b'It was the best of times, it was the worst of times, it was the age of wisdom, '
+    b'it was the age of foolishness, it was the epoch of belief, it was the epoch of '
+    b'incredulity, it was the season of Light, it was the season of Darkness, it was '
+    b'the spring of hope, it was the winter of despair, we had everything before us, '
+    b'we had nothing before us, we were all going direct to Heaven, we were all going '
+    b'direct the other way.\n'
+)
+
+
+@pytest.mark.parametrize('key', [b'K', b'ICE', b'crypy!', b'a longer key of 17'])
+def test_xork_solve(key):
+    ct = xork(TEXT * 4, key)
+    assert xork_keylens(ct, method='hamming')[0][0] % len(key) == 0
+    assert xork_keylens(ct, method='ioc')[0][0] % len(key) == 0
+    assert xork_solve(ct)[0][0] == key
+    assert xork_solve(ct, keylen=len(key))[0][0] == key
+
+def test_xork_solve_many():
+    rng = random.Random(1)
+    key = b'SECRET'
+    lines = TEXT.split(b', ')
+    cts = [xork(line, key) for line in lines]
+    assert xork_solve(cts, keylen=len(key))[0][0] == key
+    assert xork_solve(cts, max_keylen=12)[0][0] == key
+    rng.shuffle(cts)
+    assert xork_solve(cts, max_keylen=12)[0][0] == key
+
+def test_xork_solve_top():
+    ct = xork(TEXT[:40], b'xy')
+    keys = xork_solve(ct, keylen=2, top=5)
+    assert len(keys) == 5
+    assert [s for _, s in keys] == sorted((s for _, s in keys), reverse=True)
+    assert b'xy' in [k for k, _ in keys]
+
+def test_xork_solve_freqs():
+    pt = bytes(random.Random(2).choice(b'0123456789abcdef') for _ in range(2000))
+    ct = xork(pt, b'\x99\x42')
+    assert xork_solve(ct, keylen=2, freqs=pt[:500])[0][0] == b'\x99\x42'
+
+def test_crib_dragger():
+    rng = random.Random(3)
+    words = TEXT.decode().replace(',', '').split()
+    pts = [' '.join(rng.choice(words) for _ in range(10)).encode() for _ in range(40)]
+    keystream = rng.randbytes(max(map(len, pts)))
+    cts = [xork(pt, keystream[:len(pt)]) for pt in pts]
+    dragger = CribDragger(cts)
+    assert dragger.pairs.shape == (40, 40, len(keystream))
+
+    results = dragger.drag(' the ', top=5)
+    assert len(results) == 5
+    assert [r.score for r in results] == sorted((r.score for r in results), reverse=True)
+    assert len({(r.offset, r.keystream) for r in results}) == 5
+    best = results[0]
+    assert best.keystream == keystream[best.offset:best.offset+5]
+    assert cts[best.index][best.offset:best.offset+5] == xork(b' the ', best.keystream)
+
+    preview = dragger.plaintexts(best)
+    assert not any(dragger.known)
+    dragger.apply(best)
+    assert dragger.plaintexts() == preview
+    for pt, p in zip(pts, preview):
+        assert p[best.offset:best.offset+5] == pt[best.offset:best.offset+5]
+        assert set(p[:best.offset]) <= {ord('?')}
+
+    # Later hypotheses must agree with the committed keystream
+    for r in dragger.drag(' was ', top=20):
+        lo, hi = max(r.offset, best.offset), min(r.offset + 5, best.offset + 5)
+        if lo < hi:
+            assert r.keystream[lo-r.offset:hi-r.offset] == keystream[lo:hi]
+
+    dragger.set_plaintext(0, 0, pts[0])
+    assert dragger.plaintexts()[0] == pts[0]
+    with pytest.raises(ValueError):
+        dragger.set_plaintext(0, 1, pts[0])